@@ -0,0 +1,59 @@
+"""Benchmark ReportGenerator.create_pdf_report.
+
+Prints render time, page count and output size for 10, 1k and 100k rows,
+with and without an embedded chart.
+
+Usage: python benchmarks/bench_pdf_report.py [rows ...]
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reports import ReportGenerator, PDF_ROWS_PER_PAGE  # noqa: E402
+
+
+def make_tests(count: int):
+    rng = random.Random(count)
+    start = datetime(2024, 3, 20, 8, 0)
+    tests = []
+    for i in range(count):
+        created = start + timedelta(hours=6 * i)
+        tests.append({
+            "id": i + 1,
+            "user_id": 1,
+            "glucose": rng.randint(60, 260),
+            "fasting": rng.random() < 0.5,
+            "test_time": rng.choice(["07:30", "08:00", "09:30", "12:00"]),
+            "symptoms": rng.choice(["هیچکدام", "سرگیجه", "سردرد", "تشنگی بیش از حد"]),
+            "notes": "",
+            "shamsi_date": "1403/01/01",
+            "created_at": created.isoformat(),
+        })
+    return tests
+
+
+def main() -> None:
+    sizes = [int(n) for n in sys.argv[1:]] or [10, 1000, 100000]
+    chart = ReportGenerator.create_monthly_chart(make_tests(30))
+
+    # Load fonts and backends before timing
+    ReportGenerator.create_pdf_report(make_tests(1))
+
+    print(f"{'rows':>8} {'chart':>6} {'pages':>6} {'seconds':>9} {'KiB':>9}")
+    for size in sizes:
+        tests = make_tests(size)
+        for chart_image in (None, chart):
+            started = time.perf_counter()
+            pdf = ReportGenerator.create_pdf_report(tests, chart_image)
+            elapsed = time.perf_counter() - started
+            pages = 1 + (size + PDF_ROWS_PER_PAGE - 1) // PDF_ROWS_PER_PAGE
+            print(f"{size:>8} {'yes' if chart_image else 'no':>6} {pages:>6} "
+                  f"{elapsed:>9.3f} {len(pdf) / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Measure the overhead of SQLitePersistence on the handler path.
+
+Feeds synthetic updates from many users through Application.process_update
+with a handler that writes context.user_data, once without persistence
+and once with it. It then times one persistence run (update_persistence
+plus the batched SQLite flush). A local fake Bot API server answers
+getMe, so no real token is needed.
+
+Usage: python benchmarks/bench_persistence.py [updates] [users]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from telegram import Chat, Message, Update, User  # noqa: E402
+from telegram.ext import Application, TypeHandler  # noqa: E402
+
+from bench_startup import FakeBotAPI  # noqa: E402
+from persistence import SQLitePersistence  # noqa: E402
+
+
+async def handler(update: Update, context) -> None:
+    context.user_data['glucose'] = update.update_id % 400 + 60
+    context.user_data['fasting'] = update.update_id % 2 == 0
+    context.user_data['time'] = "08:00"
+
+
+def make_updates(count: int, users: int):
+    updates = []
+    for i in range(count):
+        user_id = i % users + 1
+        user = User(user_id, "Bench", False)
+        chat = Chat(user_id, Chat.PRIVATE)
+        message = Message(i, datetime.now(), chat, from_user=user, text="120")
+        updates.append(Update(i, message=message))
+    return updates
+
+
+async def run(port: int, updates, persistence=None):
+    builder = Application.builder().token("123456:bench") \
+        .base_url(f"http://127.0.0.1:{port}/bot")
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    application.add_handler(TypeHandler(Update, handler))
+
+    await application.initialize()
+    started = time.perf_counter()
+    for update in updates:
+        await application.process_update(update)
+    handling = time.perf_counter() - started
+
+    flushing = 0.0
+    if persistence is not None:
+        started = time.perf_counter()
+        await application.update_persistence()
+        await persistence._flush_pending()
+        flushing = time.perf_counter() - started
+    await application.shutdown()
+    return handling, flushing
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    updates = make_updates(count, users)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    try:
+        plain, _ = asyncio.run(run(port, updates))
+        with tempfile.TemporaryDirectory() as tmp:
+            persistence = SQLitePersistence(
+                os.path.join(tmp, "state.db"), update_interval=3600)
+            persisted, flush = asyncio.run(run(port, updates, persistence))
+    finally:
+        server.shutdown()
+
+    print(f"{count} updates from {users} users")
+    print(f"without persistence: {plain / count * 1e6:8.1f} us/update")
+    print(f"with persistence:    {persisted / count * 1e6:8.1f} us/update")
+    print(f"overhead:            {(persisted - plain) / count * 1e6:8.1f} us/update")
+    print(f"one batched flush:   {flush * 1000:8.1f} ms for {users} users "
+          f"({persistence.flush_count} transaction)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Measure bot start-up time.
+
+Reports how long `import main` takes and the time from spawning
+`python main.py` until its reply to a /start update is received. A small
+fake Bot API server on localhost serves getMe/getUpdates and records the
+sendMessage call, so no real token or network access is needed.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+START_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+    }
+}
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    replied = threading.Event()
+    update_sent = False
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, result, status=200):
+        body = json.dumps({"ok": status == 200, "result": result}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The bot process was terminated mid long-poll
+            pass
+
+    def do_GET(self):
+        # Database warm-up hits the same server; answer with no rows
+        self._reply([])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        method = self.path.rsplit("/", 1)[-1]
+
+        if method == "getMe":
+            self._reply({"id": 42, "is_bot": True, "first_name": "Bench",
+                         "username": "bench_bot"})
+        elif method == "getUpdates":
+            cls = type(self)
+            if not cls.update_sent:
+                cls.update_sent = True
+                self._reply([START_UPDATE])
+            else:
+                time.sleep(0.2)
+                self._reply([])
+        elif method == "sendMessage":
+            type(self).replied.set()
+            self._reply({"message_id": 2, "date": int(time.time()),
+                         "chat": {"id": 1, "type": "private"}, "text": "ok"})
+        else:
+            self._reply(True)
+
+
+def bench_import() -> float:
+    code = ("import time; t = time.perf_counter(); import main; "
+            "print(time.perf_counter() - t)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(0),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def bench_first_update(port: int) -> float:
+    FakeBotAPI.replied.clear()
+    FakeBotAPI.update_sent = False
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT,
+                               env=_env(port), stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        if not FakeBotAPI.replied.wait(60):
+            raise RuntimeError("bot did not answer /start within 60s")
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _env(port: int) -> dict:
+    env = dict(os.environ)
+    env["BOT_TOKEN"] = "123456:bench"
+    env["TELEGRAM_API_URL"] = f"http://127.0.0.1:{port}"
+    env["SUPABASE_URL"] = f"http://127.0.0.1:{port}"
+    env["SUPABASE_KEY"] = "bench"
+    return env
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    try:
+        imports = [bench_import() for _ in range(runs)]
+        first_updates = [bench_first_update(port) for _ in range(runs)]
+    finally:
+        server.shutdown()
+
+    print(f"import main:          min {min(imports):.3f}s  "
+          f"avg {sum(imports) / runs:.3f}s")
+    print(f"first handled update: min {min(first_updates):.3f}s  "
+          f"avg {sum(first_updates) / runs:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark stats.compute_stats against the per-format loops it replaced.
+
+Before compute_stats, the text, Excel and PDF reports and get_weekly_stats
+each walked the tests separately for mean/min/max and fasting counts.
+"loops" reproduces those four passes; "numpy" is one compute_stats call,
+which also covers std, percentiles, CV, GMI and the range buckets.
+
+Usage: python benchmarks/bench_stats.py [rows ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import compute_stats  # noqa: E402
+from bench_pdf_report import make_tests  # noqa: E402
+
+
+def text_report_loop(tests):
+    glucose_values = [t['glucose'] for t in tests]
+    avg_glucose = sum(glucose_values) / len(glucose_values)
+    fasting_count = len([t for t in tests if t['fasting']])
+    return avg_glucose, min(glucose_values), max(glucose_values), fasting_count
+
+
+def excel_report_loop(tests):
+    count = 0
+    total = 0
+    min_glucose = max_glucose = tests[0]['glucose']
+    for test in tests:
+        glucose = test['glucose']
+        count += 1
+        total += glucose
+        if glucose < min_glucose:
+            min_glucose = glucose
+        if glucose > max_glucose:
+            max_glucose = glucose
+    return total / count, min_glucose, max_glucose
+
+
+def pdf_report_loop(tests):
+    glucose_values = [t['glucose'] for t in tests]
+    fasting_count = sum(1 for t in tests if t['fasting'])
+    return (sum(glucose_values) / len(glucose_values), min(glucose_values),
+            max(glucose_values), fasting_count)
+
+
+def weekly_stats_loop(tests):
+    glucose_values = [t['glucose'] for t in tests]
+    fasting_count = len([t for t in tests if t['fasting']])
+    return sum(glucose_values) / len(glucose_values), fasting_count
+
+
+def loops(tests):
+    for func in (text_report_loop, excel_report_loop, pdf_report_loop, weekly_stats_loop):
+        func(tests)
+
+
+def best_of(func, tests, runs: int) -> float:
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(tests)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    sizes = [int(n) for n in sys.argv[1:]] or [30, 1000, 100000, 1000000]
+    compute_stats(make_tests(10))
+
+    print(f"{'rows':>8} {'loops ms':>10} {'numpy ms':>10} {'speed-up':>9}")
+    for size in sizes:
+        tests = make_tests(size)
+        runs = max(3, min(200, 200000 // size))
+        loop_time = best_of(loops, tests, runs)
+        numpy_time = best_of(compute_stats, tests, runs)
+        print(f"{size:>8} {loop_time * 1000:>10.3f} {numpy_time * 1000:>10.3f} "
+              f"{loop_time / numpy_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
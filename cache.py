@@ -0,0 +1,203 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Callable, Hashable, Tuple
+
+from rolling_stats import RollingStatsStore, create_rolling_stats_store
+
+
+class TestCache:
+    """Per-user LRU cache of query results with a TTL.
+
+    Entries are grouped by user so that a write can drop everything cached
+    for that user in one step. The least recently used user is evicted once
+    more than max_users are held.
+    """
+
+    def __init__(self, max_users: int = 1000, ttl: float = 300):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Per-user counters bumped on every invalidation so that a load
+        # which started before a write to that user cannot store its
+        # now-stale result afterwards; other users' loads are unaffected.
+        # _generation covers counters dropped to keep _epochs bounded.
+        self._epochs: Dict[int, int] = {}
+        self._generation = 0
+        self._users: "OrderedDict[int, Dict[Hashable, Tuple[float, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) for a cached entry"""
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is not None:
+                entry = entries.get(key)
+                if entry is not None:
+                    expires_at, value = entry
+                    if expires_at > time.monotonic():
+                        self._users.move_to_end(user_id)
+                        self.hits += 1
+                        return True, value
+                    del entries[key]
+            self.misses += 1
+            return False, None
+
+    def epoch(self, user_id: int) -> Tuple[int, int]:
+        """Token to pass to set() for a load that starts now"""
+        with self._lock:
+            return self._generation, self._epochs.get(user_id, 0)
+
+    def set(self, user_id: int, key: Hashable, value: Any,
+            epoch: Optional[Tuple[int, int]] = None) -> None:
+        with self._lock:
+            if epoch is not None and epoch != (self._generation, self._epochs.get(user_id, 0)):
+                return
+            entries = self._users.setdefault(user_id, {})
+            entries[key] = (time.monotonic() + self.ttl, value)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every cached result for a user"""
+        with self._lock:
+            if len(self._epochs) >= self.max_users * 4 and user_id not in self._epochs:
+                self._epochs.clear()
+                self._generation += 1
+            self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0,
+                "users": len(self._users)
+            }
+
+
+class CachedDatabase:
+    """Read-through cache in front of a Database.
+
+    Reads are served from a TestCache keyed by user; add_test and
+    delete_test invalidate the affected user's entries once the write
+    succeeds. Overall statistics come from a RollingStatsStore that is
+    updated in place by the same writes.
+    """
+
+    def __init__(self, database, cache: Optional[TestCache] = None,
+                 stats_store: Optional[RollingStatsStore] = None):
+        self.database = database
+        if cache is None:
+            cache = TestCache(
+                max_users=int(os.environ.get("CACHE_MAX_USERS", "1000")),
+                ttl=float(os.environ.get("CACHE_TTL_SECONDS", "300")))
+        self.cache = cache
+        if stats_store is None:
+            stats_store = create_rolling_stats_store(
+                database.get_user_aggregates)
+        self.stats_store = stats_store
+        if hasattr(database, "add_flush_listener"):
+            # Write-behind: queued tests reach the database later, so drop
+            # what was cached (or seeded) without them once they land
+            database.add_flush_listener(self._invalidate_rows)
+
+    def _invalidate_rows(self, rows: List[Dict]) -> None:
+        for user_id in {row['user_id'] for row in rows}:
+            self.cache.invalidate(user_id)
+            self.stats_store.invalidate(user_id)
+
+    def _cached(self, user_id: int, key: Hashable, loader: Callable[[], Any]) -> Any:
+        found, value = self.cache.get(user_id, key)
+        if found:
+            return value
+        epoch = self.cache.epoch(user_id)
+        value = loader()
+        if not _is_empty(value):
+            self.cache.set(user_id, key, value, epoch)
+        return value
+
+    def add_test(self, user_id: int, glucose: int, fasting: bool,
+                 test_time: str, symptoms: str, notes: Optional[str] = None) -> Optional[Dict]:
+        """Add a new glucose test record"""
+        test = self.database.add_test(
+            user_id, glucose, fasting, test_time, symptoms, notes)
+        if test:
+            self.cache.invalidate(user_id)
+            self.stats_store.record_add(user_id, test)
+        return test
+
+    def add_tests_bulk(self, rows: List[Dict]) -> Optional[List[Dict]]:
+        """Insert many prepared rows; None if the insert failed"""
+        result = self.database.add_tests_bulk(rows)
+        if result is not None:
+            self._invalidate_rows(rows)
+        return result
+
+    def get_user_tests(self, user_id: int, limit: int = 100) -> List[Dict]:
+        """Get all tests for a user"""
+        return self._cached(user_id, ("user_tests", limit),
+                            lambda: self.database.get_user_tests(user_id, limit))
+
+    def get_user_tests_page(self, user_id: int, limit: int,
+                            cursor: Optional[Tuple[str, int]] = None,
+                            newer: bool = False) -> List[Dict]:
+        """Get one page of a user's tests, newest first"""
+        return self._cached(user_id, ("user_tests_page", limit, cursor, newer),
+                            lambda: self.database.get_user_tests_page(
+                                user_id, limit, cursor, newer))
+
+    def get_weekly_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get weekly statistics for a user"""
+        return self._cached(user_id, ("weekly_stats",),
+                            lambda: self.database.get_weekly_stats(user_id))
+
+    def get_monthly_tests(self, user_id: int, year: int, month: int) -> List[Dict]:
+        """Get tests for a specific Jalali month"""
+        return self._cached(user_id, ("monthly_tests", year, month),
+                            lambda: self.database.get_monthly_tests(user_id, year, month))
+
+    def delete_test(self, test_id: int, user_id: Optional[int] = None) -> bool:
+        """Delete a test by ID
+
+        Pass user_id when it is known; the test row is then only fetched
+        if that user's running statistics need correcting.
+        """
+        test = None
+        if user_id is None or self.stats_store.holds(user_id):
+            test = self.database.get_test_by_id(test_id)
+            if test:
+                user_id = test['user_id']
+        deleted = self.database.delete_test(test_id, user_id)
+        if deleted and user_id is not None:
+            self.cache.invalidate(user_id)
+            if test:
+                self.stats_store.record_delete(user_id, test)
+            else:
+                self.stats_store.invalidate(user_id)
+        return deleted
+
+    def get_test_by_id(self, test_id: int) -> Optional[Dict]:
+        """Get a test by ID"""
+        return self.database.get_test_by_id(test_id)
+
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get overall statistics for a user"""
+        return self.stats_store.get(user_id)
+
+
+def _is_empty(value: Any) -> bool:
+    # Database methods swallow errors and return empty results, so these
+    # are not cached: a transient failure must not hide a user's data.
+    if isinstance(value, dict):
+        return not value.get("count", value.get("total_tests"))
+    return not value
@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from functools import cached_property
+from operator import itemgetter
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Classification levels, in increasing glucose order
+LOW, NORMAL, ELEVATED, HIGH = range(4)
+
+# Marker per level in test lists
+LEVEL_EMOJIS = ("🟣", "🟢", "🟡", "🔴")
+# Icon and word per level in status lines
+LEVEL_ICONS = ("⚠️", "✅", "⚠️", "🔴")
+LEVEL_WORDS = ("هشدار", "عالی", "هشدار", "خطر")
+
+
+@dataclass(frozen=True)
+class RangeTable:
+    # Readings below low_below are LOW, up to normal_max NORMAL, up to
+    # elevated_max ELEVATED and anything above HIGH
+    low_below: float
+    normal_max: float
+    elevated_max: float
+    labels: Tuple[str, str, str, str]
+
+    def classify(self, glucose: float) -> int:
+        return (int(glucose >= self.low_below) + int(glucose > self.normal_max)
+                + int(glucose > self.elevated_max))
+
+
+@dataclass(frozen=True)
+class TargetProfile:
+    """Target ranges for one kind of patient, for fasting and other tests"""
+    key: str
+    name: str
+    fasting: RangeTable
+    non_fasting: RangeTable
+
+    def table(self, fasting: bool) -> RangeTable:
+        return self.fasting if fasting else self.non_fasting
+
+    def classify(self, glucose: float, fasting: bool) -> int:
+        """Level of a single reading"""
+        return self.table(fasting).classify(glucose)
+
+    def label(self, glucose: float, fasting: bool) -> str:
+        table = self.table(fasting)
+        return table.labels[table.classify(glucose)]
+
+    def classify_many(self, glucose: np.ndarray, fasting: np.ndarray) -> np.ndarray:
+        """Levels of many readings in one vectorized pass"""
+        bounds = np.where(fasting[:, None], self._bounds[0], self._bounds[1])
+        return ((glucose >= bounds[:, 0]).astype(np.int8)
+                + (glucose > bounds[:, 1]) + (glucose > bounds[:, 2]))
+
+    def classify_tests(self, tests: Sequence[Dict]) -> np.ndarray:
+        """classify_many over test rows"""
+        count = len(tests)
+        glucose = np.fromiter(map(itemgetter('glucose'), tests), dtype=np.float64, count=count)
+        fasting = np.fromiter(map(itemgetter('fasting'), tests), dtype=bool, count=count)
+        return self.classify_many(glucose, fasting)
+
+    @cached_property
+    def _bounds(self) -> np.ndarray:
+        # Rows: fasting, non-fasting; columns: the three boundaries
+        return np.array([[t.low_below, t.normal_max, t.elevated_max]
+                         for t in (self.fasting, self.non_fasting)])
+
+
+_LOW_LABEL = "قند خون پایین (هایپوگلیسمی)"
+_TARGET_LABELS = (_LOW_LABEL, "در محدوده هدف", "بالاتر از هدف", "بسیار بالا")
+
+PROFILES: Dict[str, TargetProfile] = {
+    profile.key: profile for profile in (
+        TargetProfile(
+            key="standard",
+            name="استاندارد",
+            fasting=RangeTable(70, 100, 125, (
+                _LOW_LABEL, "در محدوده نرمال ناشتا", "پیش‌دیابتی", "دیابتی")),
+            non_fasting=RangeTable(70, 140, 200, (
+                _LOW_LABEL, "در محدوده نرمال", "بالا", "بسیار بالا")),
+        ),
+        # Gestational targets: fasting up to 95, two hours after a meal up to 120
+        TargetProfile(
+            key="pregnancy",
+            name="بارداری",
+            fasting=RangeTable(70, 95, 125, _TARGET_LABELS),
+            non_fasting=RangeTable(70, 120, 180, _TARGET_LABELS),
+        ),
+        # Children with type 1 diabetes: wider targets to limit hypoglycemia
+        TargetProfile(
+            key="pediatric",
+            name="کودکان",
+            fasting=RangeTable(70, 130, 180, _TARGET_LABELS),
+            non_fasting=RangeTable(70, 180, 250, _TARGET_LABELS),
+        ),
+    )
+}
+DEFAULT_PROFILE = PROFILES["standard"]
+
+
+def profile_for(user_data: Optional[Mapping]) -> TargetProfile:
+    """The target profile a user picked, kept in their (persisted) user_data"""
+    if not user_data:
+        return DEFAULT_PROFILE
+    return PROFILES.get(user_data.get('target_profile'), DEFAULT_PROFILE)
+
+
+def status_line(profile: TargetProfile, glucose: float, fasting: bool,
+                title: Optional[str] = None) -> str:
+    """Markdown status line such as "✅ **عالی:** در محدوده نرمال"
+
+    title replaces the level word, e.g. "آخرین آزمایش".
+    """
+    level = profile.classify(glucose, fasting)
+    return (f"{LEVEL_ICONS[level]} **{title or LEVEL_WORDS[level]}:** "
+            f"{profile.table(fasting).labels[level]}")
@@ -1,26 +1,64 @@
 import os
-from supabase import create_client, Client
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from dotenv import load_dotenv
-import jdatetime
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from storage import (StorageBackend, PageCursor, BOT_TIMEZONE, empty_weekly_stats,
+                     weekly_stats_from_tests)
+from cache import CachedDatabase
+from write_behind import WriteBehindDatabase
 
 # Load environment variables
 load_dotenv()
 
 
-class Database:
+class Database(StorageBackend):
+    """Supabase-backed storage"""
+
     def __init__(self):
         self.url = os.environ.get("SUPABASE_URL")
         self.key = os.environ.get("SUPABASE_KEY")
         if not self.url or not self.key:
             raise ValueError(
                 "Supabase URL and Key must be set in environment variables")
-        self.client: Client = create_client(self.url, self.key)
+        self._client: Optional["Client"] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> "Client":
+        """Supabase client, created on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(self.url, self.key)
+        return self._client
+
+    def warm_up(self) -> threading.Thread:
+        """Create the client and open a connection in a background thread"""
+        def run():
+            try:
+                self.client.table('glucose_tests') \
+                    .select('id') \
+                    .limit(1) \
+                    .execute()
+            except Exception as e:
+                print(f"Error warming up database: {e}")
+
+        thread = threading.Thread(target=run, name="db-warm-up", daemon=True)
+        thread.start()
+        return thread
 
     def create_tables(self):
         """Create necessary tables if they don't exist"""
         # Note: You need to create tables manually in Supabase dashboard
+        # and run the scripts in sql/ from the SQL editor.
         # This is just a helper function
         pass
 
@@ -28,21 +66,8 @@ class Database:
                  test_time: str, symptoms: str, notes: Optional[str] = None) -> Optional[Dict]:
         """Add a new glucose test record"""
         try:
-            # Get current Jalali date
-            now = datetime.now()
-            jalali_date = jdatetime.datetime.fromgregorian(datetime=now)
-            shamsi_date = jalali_date.strftime("%Y/%m/%d")
-
-            data = {
-                "user_id": user_id,
-                "glucose": glucose,
-                "fasting": fasting,
-                "test_time": test_time,
-                "symptoms": symptoms,
-                "notes": notes,
-                "shamsi_date": shamsi_date,
-                "created_at": now.isoformat()
-            }
+            data = self.build_test_row(
+                user_id, glucose, fasting, test_time, symptoms, notes)
 
             response = self.client.table(
                 'glucose_tests').insert(data).execute()
@@ -51,6 +76,26 @@ class Database:
             print(f"Error adding test: {e}")
             return None
 
+    def add_tests_bulk(self, rows: List[Dict]) -> Optional[List[Dict]]:
+        """Insert many prepared rows in one request
+
+        Rows carrying a client_id are upserted on it, so replaying a batch
+        that was already written does not duplicate tests; only the rows
+        actually inserted are returned. Returns None if the insert failed.
+        """
+        try:
+            if rows and all(row.get('client_id') for row in rows):
+                response = self.client.table('glucose_tests') \
+                    .upsert(rows, on_conflict='client_id', ignore_duplicates=True) \
+                    .execute()
+            else:
+                response = self.client.table(
+                    'glucose_tests').insert(rows).execute()
+            return response.data
+        except Exception as e:
+            print(f"Error adding tests in bulk: {e}")
+            return None
+
     def get_user_tests(self, user_id: int, limit: int = 100) -> List[Dict]:
         """Get all tests for a user"""
         try:
@@ -65,67 +110,60 @@ class Database:
             print(f"Error getting user tests: {e}")
             return []
 
+    def get_user_tests_page(self, user_id: int, limit: int,
+                            cursor: Optional[PageCursor] = None,
+                            newer: bool = False) -> List[Dict]:
+        """Get one page of a user's tests, newest first
+
+        Keyset pagination on (created_at, id) through the
+        glucose_tests_page function, so a page costs the same however
+        far back it is.
+        """
+        try:
+            created_at, test_id = cursor if cursor else (None, None)
+            response = self.client.rpc('glucose_tests_page', {
+                'p_user_id': user_id,
+                'p_limit': limit,
+                'p_cursor_created_at': created_at,
+                'p_cursor_id': test_id,
+                'p_newer': newer
+            }).execute()
+            tests = response.data
+            return tests[::-1] if newer else tests
+        except Exception as e:
+            print(f"Error getting user tests page: {e}")
+            return []
+
     def get_weekly_stats(self, user_id: int) -> Dict[str, Any]:
         """Get weekly statistics for a user"""
         try:
             from datetime import datetime, timedelta
-            week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+            week_ago = (datetime.now(BOT_TIMEZONE) - timedelta(days=7)).isoformat()
 
             response = self.client.table('glucose_tests') \
                 .select('*') \
                 .eq('user_id', user_id) \
                 .gte('created_at', week_ago) \
+                .order('created_at', desc=True) \
                 .execute()
 
-            tests = response.data
-
-            if not tests:
-                return {
-                    "count": 0,
-                    "avg_glucose": 0,
-                    "fasting_count": 0,
-                    "non_fasting_count": 0,
-                    "tests": []
-                }
-
-            glucose_values = [t['glucose'] for t in tests]
-            fasting_count = len([t for t in tests if t['fasting']])
-
-            return {
-                "count": len(tests),
-                "avg_glucose": sum(glucose_values) / len(glucose_values),
-                "fasting_count": fasting_count,
-                "non_fasting_count": len(tests) - fasting_count,
-                "tests": tests
-            }
+            return weekly_stats_from_tests(response.data)
         except Exception as e:
             print(f"Error getting weekly stats: {e}")
-            return {
-                "count": 0,
-                "avg_glucose": 0,
-                "fasting_count": 0,
-                "non_fasting_count": 0,
-                "tests": []
-            }
+            return empty_weekly_stats()
 
     def get_monthly_tests(self, user_id: int, year: int, month: int) -> List[Dict]:
-        """Get tests for a specific Jalali month"""
-        try:
-            # Get start and end of Jalali month
-            start_date_jalali = jdatetime.date(year, month, 1)
-            if month == 12:
-                end_date_jalali = jdatetime.date(year + 1, 1, 1)
-            else:
-                end_date_jalali = jdatetime.date(year, month + 1, 1)
-
-            start_date_gregorian = start_date_jalali.togregorian()
-            end_date_gregorian = end_date_jalali.togregorian()
+        """Get tests for a specific Jalali month
 
+        Matches the stored jalali_year/jalali_month columns, an equality
+        lookup on the (user_id, jalali_year, jalali_month) index.
+        """
+        try:
             response = self.client.table('glucose_tests') \
                 .select('*') \
                 .eq('user_id', user_id) \
-                .gte('created_at', start_date_gregorian.isoformat()) \
-                .lt('created_at', end_date_gregorian.isoformat()) \
+                .eq('jalali_year', year) \
+                .eq('jalali_month', month) \
                 .order('created_at', desc=True) \
                 .execute()
 
@@ -134,11 +172,13 @@ class Database:
             print(f"Error getting monthly tests: {e}")
             return []
 
-    def delete_test(self, test_id: int) -> bool:
-        """Delete a test by ID"""
+    def delete_test(self, test_id: int, user_id: Optional[int] = None) -> bool:
+        """Delete a test by ID, only if it is user_id's when that is given"""
         try:
-            response = self.client.table(
-                'glucose_tests').delete().eq('id', test_id).execute()
+            query = self.client.table('glucose_tests').delete().eq('id', test_id)
+            if user_id is not None:
+                query = query.eq('user_id', user_id)
+            query.execute()
             return True
         except Exception as e:
             print(f"Error deleting test: {e}")
@@ -156,44 +196,117 @@ class Database:
             print(f"Error getting test by ID: {e}")
             return None
 
-    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
-        """Get overall statistics for a user"""
+    def get_user_aggregates(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get the raw server-side aggregates for a user
+
+        Returns total_tests, avg_glucose, min_glucose, max_glucose,
+        fasting_count, var_glucose (population variance) and last_test,
+        or None if the query failed.
+        """
         try:
-            response = self.client.table('glucose_tests') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .execute()
+            response = self.client.rpc('glucose_user_stats', {
+                'p_user_id': user_id
+            }).execute()
+            return response.data[0] if response.data else {
+                "total_tests": 0}
+        except Exception as e:
+            print(f"Error getting user aggregates: {e}")
+            return None
 
-            tests = response.data
 
-            if not tests:
-                return {
-                    "total_tests": 0,
-                    "avg_glucose": 0,
-                    "last_test": None,
-                    "min_glucose": 0,
-                    "max_glucose": 0
-                }
-
-            glucose_values = [t['glucose'] for t in tests]
-
-            return {
-                "total_tests": len(tests),
-                "avg_glucose": sum(glucose_values) / len(glucose_values),
-                "min_glucose": min(glucose_values),
-                "max_glucose": max(glucose_values),
-                "last_test": tests[0] if tests else None
-            }
-        except Exception as e:
-            print(f"Error getting user stats: {e}")
-            return {
-                "total_tests": 0,
-                "avg_glucose": 0,
-                "last_test": None,
-                "min_glucose": 0,
-                "max_glucose": 0
-            }
-
-
-# Create global database instance
-db = Database()
+class AsyncDatabase:
+    """Awaitable facade over a storage backend (or the CachedDatabase in
+    front of one) for use inside async handlers.
+
+    The supabase client is synchronous, so every call is dispatched to a
+    bounded thread pool instead of running on the event loop. Concurrent
+    users then wait on I/O in parallel rather than queueing behind each
+    other's queries.
+    """
+
+    def __init__(self, database: Union[StorageBackend, CachedDatabase],
+                 max_workers: Optional[int] = None):
+        self.database = database
+        if max_workers is None:
+            max_workers = int(os.environ.get("DB_MAX_WORKERS", "8"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="db")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(func, *args, **kwargs))
+
+    async def add_test(self, user_id: int, glucose: int, fasting: bool,
+                       test_time: str, symptoms: str, notes: Optional[str] = None) -> Optional[Dict]:
+        """Add a new glucose test record"""
+        return await self._run(self.database.add_test, user_id, glucose,
+                               fasting, test_time, symptoms, notes)
+
+    async def add_tests_bulk(self, rows: List[Dict]) -> Optional[List[Dict]]:
+        """Insert many prepared rows; None if the insert failed"""
+        return await self._run(self.database.add_tests_bulk, rows)
+
+    async def get_user_tests(self, user_id: int, limit: int = 100) -> List[Dict]:
+        """Get all tests for a user"""
+        return await self._run(self.database.get_user_tests, user_id, limit)
+
+    async def get_user_tests_page(self, user_id: int, limit: int,
+                                  cursor: Optional[PageCursor] = None,
+                                  newer: bool = False) -> List[Dict]:
+        """Get one page of a user's tests, newest first"""
+        return await self._run(self.database.get_user_tests_page,
+                               user_id, limit, cursor, newer)
+
+    async def get_weekly_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get weekly statistics for a user"""
+        return await self._run(self.database.get_weekly_stats, user_id)
+
+    async def get_monthly_tests(self, user_id: int, year: int, month: int) -> List[Dict]:
+        """Get tests for a specific Jalali month"""
+        return await self._run(self.database.get_monthly_tests, user_id, year, month)
+
+    async def delete_test(self, test_id: int, user_id: Optional[int] = None) -> bool:
+        """Delete a test by ID, only if it is user_id's when that is given"""
+        return await self._run(self.database.delete_test, test_id, user_id)
+
+    async def get_test_by_id(self, test_id: int) -> Optional[Dict]:
+        """Get a test by ID"""
+        return await self._run(self.database.get_test_by_id, test_id)
+
+    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get overall statistics for a user"""
+        return await self._run(self.database.get_user_stats, user_id)
+
+    def shutdown(self) -> None:
+        """Stop the worker threads once pending queries finish"""
+        self.executor.shutdown(wait=True)
+
+
+def create_database() -> StorageBackend:
+    """Create the storage backend selected by DB_BACKEND
+
+    "supabase" (default) uses Database; "sqlite" uses SQLiteDatabase with
+    the file at SQLITE_PATH.
+    """
+    backend = os.environ.get("DB_BACKEND", "supabase")
+    if backend == "sqlite":
+        from sqlite_db import SQLiteDatabase
+        return SQLiteDatabase(os.environ.get("SQLITE_PATH", "glucose.db"))
+    if backend == "supabase":
+        return Database()
+    raise ValueError(f"Unknown DB_BACKEND: {backend}")
+
+
+# Create global database instances
+db = create_database()
+# Optional write-behind mode: add_test is journaled locally and inserted
+# in batches (see write_behind.py)
+write_behind_db = WriteBehindDatabase(
+    db,
+    journal_path=os.environ.get("WRITE_BEHIND_JOURNAL", "write_behind.jsonl"),
+    batch_size=int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "100")),
+    flush_interval=float(os.environ.get("WRITE_BEHIND_INTERVAL", "2"))
+) if os.environ.get("WRITE_BEHIND") == "1" else None
+cached_db = CachedDatabase(write_behind_db or db)
+async_db = AsyncDatabase(cached_db)
@@ -0,0 +1,67 @@
+import csv
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# Header names the importer recognises, so an export can be re-imported
+EXPORT_COLUMNS = ("date", "time", "glucose", "fasting", "symptoms", "notes",
+                  "shamsi_date")
+
+
+class ExportIncomplete(Exception):
+    """Raised when fewer tests were read than the user has"""
+
+
+def _count_tests(database, user_id: int) -> int:
+    summary = database.get_user_aggregates(user_id)
+    if summary is None:
+        raise ExportIncomplete("Could not count the user's tests")
+    return summary['total_tests']
+
+
+def _export_row(test: Dict) -> List:
+    return [test['created_at'], test['test_time'], test['glucose'],
+            "yes" if test['fasting'] else "no", test['symptoms'],
+            test.get('notes') or "", test['shamsi_date']]
+
+
+def export_csv_gzip(database, user_id: int, path: str, page_size: int = 1000) -> int:
+    """Write all of a user's tests, newest first, to a gzip-compressed CSV
+
+    database is a storage backend or a WriteBehindDatabase (not the async
+    facade); call this from a worker thread. Tests still queued for a
+    write-behind insert are flushed first so they are included. Tests
+    are read in keyset pages of page_size, and the next page is fetched
+    while the current one is compressed, so memory stays at two pages
+    however long the history is. Returns the number of tests written;
+    raises ExportIncomplete if a page failed.
+    """
+    if hasattr(database, "flush") and not database.flush(user_id):
+        raise ExportIncomplete("Queued tests were not written in time")
+    expected = _count_tests(database, user_id)
+
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8-sig", newline="") as file, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="export") as prefetch:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+
+        future = prefetch.submit(database.get_user_tests_page, user_id, page_size)
+        while future is not None:
+            tests = future.result()
+            future = None
+            if len(tests) == page_size:
+                last = tests[-1]
+                future = prefetch.submit(database.get_user_tests_page, user_id,
+                                         page_size, (last['created_at'], last['id']))
+            writer.writerows(_export_row(test) for test in tests)
+            count += len(tests)
+
+    # Backends return an empty page on errors, which would otherwise
+    # look like the end of the history. Tests may be deleted or added
+    # while the pages are read: a deletion lowers the count taken now,
+    # and a test added meanwhile is newer than the pages already read,
+    # so the export is only short if it is below both counts.
+    if count < expected and count < _count_tests(database, user_id):
+        raise ExportIncomplete(f"Read {count} of {expected} tests")
+    return count
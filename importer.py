@@ -0,0 +1,230 @@
+import csv
+import uuid
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, date, time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import jdatetime
+
+from storage import StorageBackend, is_valid_glucose
+
+# Header names accepted for each column, compared lower-cased
+COLUMN_ALIASES = {
+    "glucose": ("glucose", "value", "reading", "bg", "blood glucose", "mg/dl",
+                "قند", "قند خون", "مقدار"),
+    "date": ("date", "datetime", "timestamp", "تاریخ"),
+    "time": ("time", "ساعت", "زمان"),
+    "fasting": ("fasting", "ناشتا"),
+    "symptoms": ("symptoms", "علائم"),
+    "notes": ("notes", "note", "comment", "یادداشت", "توضیحات"),
+}
+FASTING_VALUES = {"1", "true", "yes", "y", "بله", "ناشتا", "fasting"}
+DEFAULT_SYMPTOMS = "هیچکدام"
+
+# Free-text cells are cut to these lengths so one cell cannot swamp the
+# test list or a report message
+SYMPTOMS_MAX_LENGTH = 100
+NOTES_MAX_LENGTH = 500
+
+# Persian and Arabic-Indic digits to ASCII
+DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "0123456789" * 2)
+
+
+class InvalidImportFile(Exception):
+    """Raised when an uploaded file has no usable header row"""
+
+
+@dataclass
+class ImportSummary:
+    # Rows inserted, and valid rows already stored by an earlier upload
+    imported: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    # Line numbers of the first rejected rows, to show the user
+    skipped_lines: List[int] = field(default_factory=list)
+    failed: bool = False
+
+
+def read_rows(path: str, filename: str) -> Iterator[Tuple[int, Sequence[Any]]]:
+    """Yield (line number, cells) from a CSV or XLSX file one row at a time"""
+    if filename.lower().endswith(".xlsx"):
+        return _read_xlsx(path)
+    return _read_csv(path)
+
+
+def _read_csv(path: str) -> Iterator[Tuple[int, Sequence[Any]]]:
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        try:
+            dialect = csv.Sniffer().sniff(file.read(4096), delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        file.seek(0)
+        yield from enumerate(csv.reader(file, dialect), 1)
+
+
+def _read_xlsx(path: str) -> Iterator[Tuple[int, Sequence[Any]]]:
+    from openpyxl import load_workbook
+
+    # read_only streams the sheet XML instead of building every cell
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from enumerate(workbook.active.iter_rows(values_only=True), 1)
+    finally:
+        workbook.close()
+
+
+def map_columns(header: Sequence[Any]) -> Dict[str, int]:
+    """Find the index of each known column in the header row"""
+    columns = {}
+    for index, name in enumerate(header):
+        name = str(name or "").strip().lower()
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in columns:
+                columns[column] = index
+    if "glucose" not in columns or "date" not in columns:
+        raise InvalidImportFile("The header row needs a glucose and a date column")
+    return columns
+
+
+def _parse_time(value: Any) -> time:
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, time):
+        return value
+    hour, _, minute = str(value).translate(DIGITS).strip().partition(":")
+    return time(int(hour), int(minute[:2] or 0))
+
+
+def parse_datetime(date_value: Any, time_value: Any = None) -> datetime:
+    """Parse a date cell, Gregorian or Jalali (year before 1700)"""
+    if isinstance(date_value, datetime):
+        moment = date_value
+    elif isinstance(date_value, date):
+        moment = datetime.combine(date_value, time())
+    else:
+        text = str(date_value).translate(DIGITS).strip().replace("-", "/").replace("T", " ")
+        date_part, _, time_part = text.partition(" ")
+        year, month, day = (int(part) for part in date_part.split("/"))
+        if year < 1700:
+            day_value = jdatetime.date(year, month, day).togregorian()
+        else:
+            day_value = date(year, month, day)
+        moment = datetime.combine(day_value, _parse_time(time_part) if time_part else time())
+
+    if time_value not in (None, ""):
+        moment = datetime.combine(moment.date(), _parse_time(time_value))
+    return moment.replace(tzinfo=None)
+
+
+def parse_row(user_id: int, cells: Sequence[Any], columns: Dict[str, int],
+              seen: Optional[Dict[Tuple[str, int], int]] = None) -> Dict:
+    """Map one row to a glucose_tests row; ValueError if it is invalid
+
+    seen counts the midnight readings parsed so far in the file, see
+    the client_id comment below.
+    """
+    def cell(name: str) -> Any:
+        index = columns.get(name)
+        return cells[index] if index is not None and index < len(cells) else None
+
+    glucose = int(float(str(cell("glucose")).translate(DIGITS).strip()))
+    if not is_valid_glucose(glucose):
+        raise ValueError(f"glucose out of range: {glucose}")
+
+    moment = parse_datetime(cell("date"), cell("time"))
+    fasting = str(cell("fasting") or "").strip().lower() in FASTING_VALUES
+    symptoms = str(cell("symptoms") or "").strip()[:SYMPTOMS_MAX_LENGTH] or DEFAULT_SYMPTOMS
+    notes = str(cell("notes") or "").strip()[:NOTES_MAX_LENGTH]
+
+    row = StorageBackend.build_test_row(
+        user_id, glucose, fasting, moment.strftime("%H:%M"), symptoms, notes,
+        created_at=moment)
+    # Derived from the reading itself, so uploading the same file twice
+    # does not duplicate tests (rows are upserted on client_id). Files
+    # without a time column put every reading at midnight, so equal
+    # readings on one day are told apart by their order in the file.
+    key = f"import:{user_id}:{row['created_at']}:{glucose}"
+    if seen is not None and moment.time() == time():
+        occurrence = seen.get((row['created_at'], glucose), 0)
+        seen[(row['created_at'], glucose)] = occurrence + 1
+        if occurrence:
+            key += f":{occurrence}"
+    row["client_id"] = str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+    return row
+
+
+def iter_chunks(user_id: int, path: str, filename: str, chunk_size: int,
+                summary: ImportSummary) -> Iterator[List[Dict]]:
+    """Yield validated rows in chunks, counting rejected rows in summary"""
+    rows = read_rows(path, filename)
+    try:
+        first = next(rows, None)
+        if first is None:
+            raise InvalidImportFile("The file is empty")
+        columns = map_columns(first[1])
+
+        # One entry per distinct (day, glucose) of midnight readings
+        seen: Dict[Tuple[str, int], int] = {}
+        chunk = []
+        for number, cells in rows:
+            if all(value in (None, "") for value in cells):
+                continue
+            try:
+                chunk.append(parse_row(user_id, cells, columns, seen))
+            except (ValueError, TypeError, OverflowError):
+                summary.skipped += 1
+                if len(summary.skipped_lines) < 10:
+                    summary.skipped_lines.append(number)
+                continue
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        rows.close()
+
+
+async def import_file(database, user_id: int, path: str, filename: str,
+                      chunk_size: int = 500,
+                      on_progress: Optional[Callable[[ImportSummary], Awaitable[None]]] = None,
+                      progress_interval: float = 2) -> ImportSummary:
+    """Import a CSV/XLSX file into database (an AsyncDatabase)
+
+    The file is parsed in a worker thread, one chunk ahead of the bulk
+    insert of the previous chunk, so memory stays at about two chunks
+    whatever the file size. on_progress is awaited at most every
+    progress_interval seconds. Raises InvalidImportFile if the header
+    is not recognised.
+    """
+    summary = ImportSummary()
+    chunks = iter_chunks(user_id, path, filename, chunk_size, summary)
+    loop = asyncio.get_running_loop()
+    last_progress = loop.time()
+    pending = None
+    try:
+        pending = loop.run_in_executor(None, next, chunks, None)
+        while True:
+            chunk = await pending
+            pending = None
+            if chunk is None:
+                break
+            pending = loop.run_in_executor(None, next, chunks, None)
+
+            inserted = await database.add_tests_bulk(chunk)
+            if inserted is None:
+                summary.failed = True
+                break
+            # Rows whose client_id is already stored are not returned
+            summary.imported += len(inserted)
+            summary.duplicates += len(chunk) - len(inserted)
+
+            if on_progress and loop.time() - last_progress >= progress_interval:
+                last_progress = loop.time()
+                await on_progress(summary)
+    finally:
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        chunks.close()
+    return summary
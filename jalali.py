@@ -0,0 +1,39 @@
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, List
+
+import jdatetime
+
+# Distinct calendar days kept per process, about eleven years
+DAY_CACHE_SIZE = 4096
+
+JALALI_MONTH_NAMES = (
+    "فروردین", "اردیبهشت", "خرداد", "تیر",
+    "مرداد", "شهریور", "مهر", "آبان",
+    "آذر", "دی", "بهمن", "اسفند"
+)
+
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def jalali_day(day: str) -> jdatetime.date:
+    """Jalali date for a Gregorian "YYYY-MM-DD" day
+
+    jdatetime converts in pure Python, and a user's tests fall on few
+    distinct days, so each day is converted once and then looked up.
+    """
+    return jdatetime.date.fromgregorian(date=date.fromisoformat(day))
+
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def format_jalali_day(day: str, fmt: str = "%Y/%m/%d") -> str:
+    """jalali_day(day).strftime(fmt), cached the same way"""
+    return jalali_day(day).strftime(fmt)
+
+
+def format_jalali_days(timestamps: Iterable[str], fmt: str = "%Y/%m/%d") -> List[str]:
+    """Format the Jalali date of each ISO created_at timestamp
+
+    Only the date part is read, which is the calendar day the timestamp
+    is stored in, so no datetime is parsed per row.
+    """
+    return [format_jalali_day(timestamp[:10], fmt) for timestamp in timestamps]
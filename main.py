@@ -1,5 +1,9 @@
 import os
+import asyncio
 import logging
+import tempfile
+from datetime import datetime, time as dtime
+from typing import Optional
 from telegram import (
     Update,
     InlineKeyboardButton,
@@ -12,14 +16,31 @@ from telegram.ext import (
     MessageHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    TypeHandler,
     filters,
     ContextTypes
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 import jdatetime
 
-from db import db
-from reports import report_generator
+from db import db, cached_db, async_db, write_behind_db
+from storage import is_valid_glucose, BOT_TIMEZONE
+from importer import import_file, InvalidImportFile, ImportSummary
+from exporter import export_csv_gzip, ExportIncomplete
+from jalali import JALALI_MONTH_NAMES
+from precompute import (ActivityTracker, ReportPrecomputer, get_text_report,
+                        monthly_report_type)
+from reminders import (ReminderScheduler, TEST_REMINDER, NO_READING_NUDGE,
+                       REMINDER_TIME_KEY, NUDGE_KEY, parse_minute,
+                       has_test_today, send_in_batches)
+from reports import report_generator, escape_markdown
+from render_pool import chart_pool, RenderQueueFull
+from render_cache import render_cache
+from webhook import WebhookBridge, create_app, default_secret_token
+from update_processor import PerUserUpdateProcessor
+from persistence import SQLitePersistence
+from rate_limiter import PriorityRateLimiter, BACKGROUND
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -41,6 +62,45 @@ if not BOT_TOKEN:
     print("❌ خطا: BOT_TOKEN در فایل .env تنظیم نشده است!")
     exit(1)
 
+# "webhook" serves updates over HTTP (main:app), "polling" uses getUpdates
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+BOT_MODE = os.environ.get("BOT_MODE", "webhook" if WEBHOOK_URL else "polling")
+
+# Tests shown per page in the test list
+TESTS_PAGE_SIZE = 10
+
+# Bulk import: rows per insert, and the Bot API's download size limit
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+
+# Full-history export: tests per keyset page
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+
+# Off-peak report precomputation: daily start time (local hour), how
+# recently a user must have been active, and users processed at once
+PRECOMPUTE_HOUR = int(os.environ.get("PRECOMPUTE_HOUR", "4"))
+PRECOMPUTE_ACTIVE_DAYS = float(os.environ.get("PRECOMPUTE_ACTIVE_DAYS", "7"))
+PRECOMPUTE_CONCURRENCY = int(os.environ.get("PRECOMPUTE_CONCURRENCY", "2"))
+
+activity_tracker = ActivityTracker(
+    max_users=int(os.environ.get("PRECOMPUTE_MAX_USERS", "5000")))
+
+# Reminders: times offered for the daily test reminder, the local time of
+# the "no reading today" nudge, and messages sent per batch and the pause
+# between batches. Reminders go out in the rate limiter's background lane,
+# which already paces them, so batches only bound how many are in flight.
+REMINDER_TIMES = ["06:00", "06:30", "07:00", "07:30", "08:00", "08:30", "09:00"]
+NUDGE_TIME = os.environ.get("NUDGE_TIME", "21:00")
+REMINDER_BATCH_SIZE = int(os.environ.get("REMINDER_BATCH_SIZE", "25"))
+REMINDER_BATCH_INTERVAL = float(os.environ.get("REMINDER_BATCH_INTERVAL", "0"))
+
+reminder_scheduler = ReminderScheduler(nudge_minute=parse_minute(NUDGE_TIME))
+
+# Seconds between logging the outgoing-message metrics that webhook mode
+# also serves on /health, so they are visible when polling, and the test
+# cache's hit rate; 0 turns it off
+METRICS_LOG_INTERVAL = float(os.environ.get("METRICS_LOG_INTERVAL", "300"))
+
 # ==================== KEYBOARD FUNCTIONS ====================
 
 
@@ -58,7 +118,14 @@ def get_main_menu() -> InlineKeyboardMarkup:
                                  callback_data="list_tests"),
             InlineKeyboardButton("📊 آمار کلی", callback_data="overall_stats")
         ],
-        [InlineKeyboardButton("📖 راهنما", callback_data="help")]
+        [
+            InlineKeyboardButton("🎯 محدوده هدف", callback_data="target_menu"),
+            InlineKeyboardButton("📦 خروجی کامل", callback_data="export_all")
+        ],
+        [
+            InlineKeyboardButton("⏰ یادآورها", callback_data="reminder_menu"),
+            InlineKeyboardButton("📖 راهنما", callback_data="help")
+        ]
     ]
     return InlineKeyboardMarkup(keyboard)
 
@@ -132,15 +199,9 @@ def get_symptoms_keyboard() -> InlineKeyboardMarkup:
 
 def get_months_keyboard() -> InlineKeyboardMarkup:
     current_year = jdatetime.datetime.now().year
-    months = [
-        "فروردین", "اردیبهشت", "خرداد", "تیر",
-        "مرداد", "شهریور", "مهر", "آبان",
-        "آذر", "دی", "بهمن", "اسفند"
-    ]
-
     keyboard = []
     row = []
-    for i, month_name in enumerate(months, 1):
+    for i, month_name in enumerate(JALALI_MONTH_NAMES, 1):
         row.append(InlineKeyboardButton(
             month_name, callback_data=f"month_{current_year}_{i}"))
         if len(row) == 3:
@@ -155,6 +216,76 @@ def get_months_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
+def get_tests_page_keyboard(tests, page: int, has_newer: bool,
+                            has_older: bool) -> InlineKeyboardMarkup:
+    """Main menu with newer/older buttons for the test list
+
+    Each button carries the keyset cursor, (created_at, id) of the edge
+    row of the current page, in its callback_data:
+    tests_<n|o>_<page>_<id>_<created_at>. That is about 55 bytes for a
+    Supabase timestamp, under Telegram's 64-byte limit.
+    """
+    navigation = []
+    if has_newer:
+        first = tests[0]
+        navigation.append(InlineKeyboardButton(
+            "◀️ جدیدتر", callback_data=f"tests_n_{page - 1}_{first['id']}_{first['created_at']}"))
+    if has_older:
+        last = tests[-1]
+        navigation.append(InlineKeyboardButton(
+            "قدیمی‌تر ▶️", callback_data=f"tests_o_{page + 1}_{last['id']}_{last['created_at']}"))
+
+    keyboard = list(get_main_menu().inline_keyboard)
+    if navigation:
+        keyboard.insert(0, navigation)
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_target_profiles_keyboard(current: str) -> InlineKeyboardMarkup:
+    from classifier import PROFILES
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'✅ ' if key == current else ''}{profile.name}",
+            callback_data=f"target_{key}")]
+        for key, profile in PROFILES.items()
+    ]
+    keyboard.append([InlineKeyboardButton(
+        "🏠 منوی اصلی", callback_data="main_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_reminders_keyboard(reminder_time: Optional[str], nudge: bool) -> InlineKeyboardMarkup:
+    keyboard = []
+    row = []
+    for time_str in REMINDER_TIMES:
+        row.append(InlineKeyboardButton(
+            f"{'✅ ' if time_str == reminder_time else ''}{time_str}",
+            callback_data=f"reminder_{time_str}"))
+        if len(row) == 4:
+            keyboard.append(row)
+            row = []
+    row.append(InlineKeyboardButton(
+        f"{'✅ ' if not reminder_time else ''}🔕 خاموش", callback_data="reminder_off"))
+    keyboard.append(row)
+
+    keyboard.extend([
+        [InlineKeyboardButton(
+            f"{'✅' if nudge else '⬜️'} یادآوری در صورت نبود آزمایش امروز",
+            callback_data="nudge_off" if nudge else "nudge_on")],
+        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_reminder_message_keyboard() -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton("➕ ثبت آزمایش جدید", callback_data="new_test")],
+        [InlineKeyboardButton("⏰ تنظیم یادآورها", callback_data="reminder_menu")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
 def get_report_types_keyboard() -> InlineKeyboardMarkup:
     keyboard = [
         [
@@ -163,8 +294,9 @@ def get_report_types_keyboard() -> InlineKeyboardMarkup:
         ],
         [
             InlineKeyboardButton("📝 متن", callback_data="text"),
-            InlineKeyboardButton("🔙 بازگشت", callback_data="back_months")
-        ]
+            InlineKeyboardButton("📄 PDF", callback_data="pdf")
+        ],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data="back_months")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
@@ -190,6 +322,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 برای راهنما «راهنما» را تایپ کنید."""
 
+    # Also reached from "main menu" buttons, which have no message to reply to
+    query = update.callback_query
+    if query:
+        await query.answer()
+        await query.edit_message_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
+        return
+
     await update.message.reply_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
 
 
@@ -212,6 +351,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 • مشاهده لیست آزمایش‌ها
 • مشاهده آمار کلی
 
+📥 **ورود اطلاعات قبلی:**
+فایل CSV یا اکسل (xlsx) با ستون‌های «تاریخ» و «قند خون» را ارسال کنید
+
 برای شروع، «ثبت آزمایش جدید» را انتخاب کنید."""
 
     await update.message.reply_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
@@ -237,7 +379,7 @@ async def get_glucose(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     try:
         glucose = int(update.message.text.strip())
 
-        if glucose <= 0 or glucose > 1000:
+        if not is_valid_glucose(glucose):
             await update.message.reply_text("❌ عدد نامعتبر! لطفاً عددی بین ۱ تا ۱۰۰۰ وارد کنید:")
             return GLUCOSE
 
@@ -312,6 +454,8 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 
 async def get_symptoms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    from classifier import profile_for, status_line
+
     query = update.callback_query
     await query.answer()
 
@@ -334,7 +478,7 @@ async def get_symptoms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
         try:
             # Save to database
-            test_data = db.add_test(
+            test_data = await async_db.add_test(
                 user_id=update.effective_user.id,
                 glucose=context.user_data['glucose'],
                 fasting=context.user_data['fasting'],
@@ -348,25 +492,8 @@ async def get_symptoms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 fasting_text = "ناشتا 🟦" if context.user_data['fasting'] else "غیرناشتا 🟧"
                 glucose = context.user_data['glucose']
 
-                status = ""
-                if context.user_data['fasting']:
-                    if glucose < 70:
-                        status = "⚠️ **هشدار:** قند خون پایین (هایپوگلیسمی)"
-                    elif glucose <= 100:
-                        status = "✅ **عالی:** در محدوده نرمال ناشتا"
-                    elif glucose <= 125:
-                        status = "⚠️ **هشدار:** پیش‌دیابتی"
-                    else:
-                        status = "🔴 **خطر:** دیابتی"
-                else:
-                    if glucose < 70:
-                        status = "⚠️ **هشدار:** قند خون پایین (هایپوگلیسمی)"
-                    elif glucose <= 140:
-                        status = "✅ **عالی:** در محدوده نرمال"
-                    elif glucose <= 200:
-                        status = "⚠️ **هشدار:** بالا"
-                    else:
-                        status = "🔴 **خطر:** بسیار بالا"
+                status = status_line(profile_for(context.user_data), glucose,
+                                     context.user_data['fasting'])
 
                 success_text = f"""✅ **آزمایش با موفقیت ثبت شد!**
 
@@ -388,7 +515,7 @@ async def get_symptoms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             logger.error(f"Error saving test: {e}")
             await query.edit_message_text("❌ خطا در ثبت آزمایش!", reply_markup=get_main_menu())
 
-        context.user_data.clear()
+        clear_test_draft(context.user_data)
         return ConversationHandler.END
 
     elif query.data == "back":
@@ -406,6 +533,12 @@ async def get_symptoms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return ConversationHandler.END
 
 
+def clear_test_draft(user_data: dict) -> None:
+    """Forget the half-entered test but keep settings such as target_profile"""
+    for key in ('glucose', 'fasting', 'time'):
+        user_data.pop(key, None)
+
+
 async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     if query:
@@ -414,25 +547,27 @@ async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
     else:
         await update.message.reply_text("❌ عملیات لغو شد.", reply_markup=get_main_menu())
 
-    context.user_data.clear()
+    clear_test_draft(context.user_data)
     return ConversationHandler.END
 
 # ==================== REPORT HANDLERS ====================
 
 
 async def weekly_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from classifier import profile_for
+
     query = update.callback_query
     await query.answer()
 
     user_id = update.effective_user.id
-    stats = db.get_weekly_stats(user_id)
+    stats = await async_db.get_weekly_stats(user_id)
 
     if stats['count'] == 0:
         await query.edit_message_text("❌ هیچ آزمایشی در ۷ روز گذشته ثبت نشده است.", reply_markup=get_main_menu())
         return
 
-    report = report_generator.create_text_report(stats['tests'], "هفتگی")
-    await query.edit_message_text(report, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
+    chunks = get_text_report(stats['tests'], "هفتگی", profile_for(context.user_data))
+    await send_text_chunks(query, context, chunks)
 
 
 async def monthly_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -460,19 +595,14 @@ async def select_month(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         context.user_data['report_month'] = month
 
         user_id = update.effective_user.id
-        tests = db.get_monthly_tests(user_id, year, month)
+        tests = await async_db.get_monthly_tests(user_id, year, month)
+
+        month_name = JALALI_MONTH_NAMES[month - 1]
 
         if not tests:
-            months = ["فروردین", "اردیبهشت", "خرداد", "تیر", "مرداد",
-                      "شهریور", "مهر", "آبان", "آذر", "دی", "بهمن", "اسفند"]
-            month_name = months[month - 1]
             await query.edit_message_text(f"❌ هیچ آزمایشی برای ماه {month_name} سال {year} یافت نشد.", reply_markup=get_main_menu())
             return
 
-        months = ["فروردین", "اردیبهشت", "خرداد", "تیر", "مرداد",
-                  "شهریور", "مهر", "آبان", "آذر", "دی", "بهمن", "اسفند"]
-        month_name = months[month - 1]
-
         await query.edit_message_text(
             f"📊 **گزارش ماه {month_name} سال {year}**\n\nتعداد آزمایش‌ها: {len(tests)}\n\nلطفاً نوع گزارش را انتخاب کنید:",
             reply_markup=get_report_types_keyboard(),
@@ -483,7 +613,57 @@ async def select_month(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await query.edit_message_text("به منوی اصلی برگشتید.", reply_markup=get_main_menu())
 
 
+async def send_text_chunks(query, context: ContextTypes.DEFAULT_TYPE, chunks) -> None:
+    """Show a chunked text report: the first chunk replaces the menu
+    message, the rest follow as new messages, and the last one carries
+    the main menu"""
+    last = len(chunks) - 1
+    for i, chunk in enumerate(chunks):
+        reply_markup = get_main_menu() if i == last else None
+        if i == 0:
+            await query.edit_message_text(chunk, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+        else:
+            await context.bot.send_message(
+                query.message.chat_id, chunk, reply_markup=reply_markup,
+                parse_mode=ParseMode.MARKDOWN)
+
+
+async def send_rendered_report(fmt: str, tests, render, send) -> bool:
+    """Send a rendered report, reusing earlier renders and uploads
+
+    render() returns the report bytes; send(file) sends either bytes or a
+    Telegram file_id and returns the sent Message. Identical inputs are
+    re-sent by file_id without rendering or uploading again.
+    """
+    key = render_cache.make_key(fmt, tests)
+    entry = render_cache.get(key)
+
+    if entry and entry.file_id:
+        try:
+            await send(entry.file_id)
+            return True
+        except BadRequest as e:
+            logger.warning(f"Cached file_id rejected, re-uploading: {e}")
+            render_cache.forget_file_id(key)
+
+    data = entry.data if entry else None
+    if data is None:
+        data = await render()
+        if not data:
+            return False
+        render_cache.put_bytes(key, data)
+
+    message = await send(data)
+    if message.photo:
+        render_cache.put_file_id(key, message.photo[-1].file_id)
+    elif message.document:
+        render_cache.put_file_id(key, message.document.file_id)
+    return True
+
+
 async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from classifier import profile_for
+
     query = update.callback_query
     await query.answer()
 
@@ -495,95 +675,160 @@ async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await query.edit_message_text("❌ خطا در دریافت اطلاعات ماه.", reply_markup=get_main_menu())
         return
 
-    tests = db.get_monthly_tests(user_id, year, month)
+    tests = await async_db.get_monthly_tests(user_id, year, month)
 
     if not tests:
         await query.edit_message_text("❌ هیچ آزمایشی برای این ماه یافت نشد.", reply_markup=get_main_menu())
         return
 
-    months = ["فروردین", "اردیبهشت", "خرداد", "تیر", "مرداد",
-              "شهریور", "مهر", "آبان", "آذر", "دی", "بهمن", "اسفند"]
-    month_name = months[month - 1]
+    month_name = JALALI_MONTH_NAMES[month - 1]
 
     if query.data == "chart":
-        chart_image = report_generator.create_monthly_chart(tests)
+        try:
+            sent = await send_rendered_report(
+                "chart", tests,
+                lambda: chart_pool.render_monthly_chart(tests),
+                lambda photo: context.bot.send_photo(
+                    chat_id=user_id,
+                    photo=photo,
+                    caption=f"📊 نمودار ماهانه قند خون - {month_name} {year}"
+                ))
+        except RenderQueueFull:
+            await query.edit_message_text("⏳ سرور مشغول است، لطفاً کمی بعد دوباره تلاش کنید.", reply_markup=get_main_menu())
+            return
 
-        if chart_image:
-            await context.bot.send_photo(
-                chat_id=user_id,
-                photo=chart_image,
-                caption=f"📊 نمودار ماهانه قند خون - {month_name} {year}"
-            )
+        if sent:
             await query.edit_message_text(f"✅ نمودار ماه {month_name} ارسال شد.", reply_markup=get_main_menu())
         else:
             await query.edit_message_text("❌ خطا در ایجاد نمودار.", reply_markup=get_main_menu())
 
     elif query.data == "excel":
-        excel_file = report_generator.create_excel_report(tests)
+        profile = profile_for(context.user_data)
+
+        async def render_excel():
+            # openpyxl is pure Python; keep it off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, report_generator.create_excel_report, tests, profile)
 
-        if excel_file:
-            await context.bot.send_document(
+        sent = await send_rendered_report(
+            f"excel:{profile.key}", tests, render_excel,
+            lambda document: context.bot.send_document(
                 chat_id=user_id,
-                document=excel_file,
+                document=document,
                 filename=f"گزارش_قند_خون_{year}_{month}.xlsx",
                 caption=f"📋 گزارش اکسل - {month_name} {year}"
-            )
+            ))
+
+        if sent:
             await query.edit_message_text(f"✅ فایل اکسل ماه {month_name} ارسال شد.", reply_markup=get_main_menu())
         else:
             await query.edit_message_text("❌ خطا در ایجاد فایل اکسل.", reply_markup=get_main_menu())
 
-    elif query.data == "text":
-        text_report = report_generator.create_text_report(
-            tests, f"ماهانه ({month_name})")
-
-        if len(text_report) > 4000:
-            parts = [text_report[i:i+4000]
-                     for i in range(0, len(text_report), 4000)]
-            for i, part in enumerate(parts):
-                if i == 0:
-                    await query.edit_message_text(part, parse_mode=ParseMode.MARKDOWN)
-                else:
-                    await context.bot.send_message(user_id, part, parse_mode=ParseMode.MARKDOWN)
+    elif query.data == "pdf":
+        async def render_pdf():
+            # Embed the month's chart if it is already rendered; otherwise
+            # render it once and keep it for the next chart or PDF request
+            chart_key = render_cache.make_key("chart", tests)
+            chart_entry = render_cache.get(chart_key)
+            chart_image = chart_entry.data if chart_entry else None
+            if chart_image is None:
+                chart_image = await chart_pool.render_monthly_chart(tests)
+                if chart_image:
+                    render_cache.put_bytes(chart_key, chart_image)
+            return await chart_pool.render_pdf_report(tests, chart_image)
+
+        try:
+            sent = await send_rendered_report(
+                "pdf", tests, render_pdf,
+                lambda document: context.bot.send_document(
+                    chat_id=user_id,
+                    document=document,
+                    filename=f"گزارش_قند_خون_{year}_{month}.pdf",
+                    caption=f"📄 گزارش PDF - {month_name} {year}"
+                ))
+        except RenderQueueFull:
+            await query.edit_message_text("⏳ سرور مشغول است، لطفاً کمی بعد دوباره تلاش کنید.", reply_markup=get_main_menu())
+            return
+
+        if sent:
+            await query.edit_message_text(f"✅ فایل PDF ماه {month_name} ارسال شد.", reply_markup=get_main_menu())
         else:
-            await query.edit_message_text(text_report, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
+            await query.edit_message_text("❌ خطا در ایجاد فایل PDF.", reply_markup=get_main_menu())
+
+    elif query.data == "text":
+        chunks = get_text_report(
+            tests, monthly_report_type(month), profile_for(context.user_data))
+        await send_text_chunks(query, context, chunks)
 
     elif query.data == "back_months":
         await monthly_menu(update, context)
 
 
 async def list_tests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from classifier import LEVEL_EMOJIS, profile_for
+
     query = update.callback_query
     await query.answer()
 
     user_id = update.effective_user.id
-    tests = db.get_user_tests(user_id, limit=10)
+    page, cursor, newer = 1, None, False
+    if query.data.startswith("tests_"):
+        _, direction, page_str, id_str, created_at = query.data.split("_", 4)
+        page, cursor, newer = int(page_str), (created_at, int(id_str)), direction == "n"
+
+    # One row past the page tells whether there is another page beyond it
+    tests, stats = await asyncio.gather(
+        async_db.get_user_tests_page(user_id, TESTS_PAGE_SIZE + 1, cursor, newer),
+        async_db.get_user_stats(user_id))
+
+    if not tests and cursor is not None:
+        # The rows around the cursor were deleted; start over
+        page, newer = 1, False
+        tests = await async_db.get_user_tests_page(user_id, TESTS_PAGE_SIZE + 1)
 
     if not tests:
         await query.edit_message_text("❌ هیچ آزمایشی ثبت نشده است.", reply_markup=get_main_menu())
         return
 
-    text = "📋 **آخرین آزمایش‌های شما**\n\n"
+    has_more = len(tests) > TESTS_PAGE_SIZE
+    if newer:
+        tests = tests[-TESTS_PAGE_SIZE:]
+        has_newer, has_older = has_more, True
+        page = max(page, 2) if has_newer else 1
+    else:
+        tests = tests[:TESTS_PAGE_SIZE]
+        has_newer, has_older = cursor is not None, has_more
+
+    text = "📋 **آخرین آزمایش‌های شما**\n\n" if page == 1 else f"📋 **آزمایش‌های شما - صفحه {page}**\n\n"
 
-    for i, test in enumerate(tests, 1):
+    profile = profile_for(context.user_data)
+    first_number = (page - 1) * TESTS_PAGE_SIZE + 1
+    for i, test in enumerate(tests, first_number):
         fasting_emoji = "🟦" if test['fasting'] else "🟧"
-        status_emoji = "🟢" if test['glucose'] <= 140 else "🟡" if test['glucose'] <= 200 else "🔴"
+        status_emoji = LEVEL_EMOJIS[profile.classify(test['glucose'], test['fasting'])]
 
         text += f"{i}. {status_emoji} **{test['shamsi_date']}** - ساعت **{test['test_time']}**\n"
         text += f"   مقدار: **{test['glucose']}** mg/dL | نوع: {fasting_emoji} "
         text += "ناشتا\n" if test['fasting'] else "غیرناشتا\n"
-        text += f"   علائم: {test['symptoms']}\n\n"
+        text += f"   علائم: {escape_markdown(test['symptoms'] or '')}\n\n"
 
-    text += f"\n📊 تعداد کل: {len(tests)}"
+    text += f"\n📊 تعداد کل: {stats['total_tests']}"
 
-    await query.edit_message_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
+    await query.edit_message_text(
+        text,
+        reply_markup=get_tests_page_keyboard(tests, page, has_newer, has_older),
+        parse_mode=ParseMode.MARKDOWN)
 
 
 async def overall_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from classifier import profile_for, status_line
+
     query = update.callback_query
     await query.answer()
 
     user_id = update.effective_user.id
-    stats = db.get_user_stats(user_id)
+    stats = await async_db.get_user_stats(user_id)
 
     if stats['total_tests'] == 0:
         await query.edit_message_text("❌ هیچ آزمایشی ثبت نشده است.", reply_markup=get_main_menu())
@@ -598,31 +843,63 @@ async def overall_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
     if stats['last_test']:
         last = stats['last_test']
-        glucose = last['glucose']
-
         text += "\n\n📈 **تحلیل آخرین آزمایش:**\n"
-        if last['fasting']:
-            if glucose < 70:
-                text += "⚠️ **آخرین آزمایش:** قند خون پایین (هایپوگلیسمی)"
-            elif glucose <= 100:
-                text += "✅ **آخرین آزمایش:** در محدوده نرمال ناشتا"
-            elif glucose <= 125:
-                text += "⚠️ **آخرین آزمایش:** پیش‌دیابتی"
-            else:
-                text += "🔴 **آخرین آزمایش:** دیابتی"
-        else:
-            if glucose < 70:
-                text += "⚠️ **آخرین آزمایش:** قند خون پایین (هایپوگلیسمی)"
-            elif glucose <= 140:
-                text += "✅ **آخرین آزمایش:** در محدوده نرمال"
-            elif glucose <= 200:
-                text += "⚠️ **آخرین آزمایش:** بالا"
-            else:
-                text += "🔴 **آخرین آزمایش:** بسیار بالا"
+        text += status_line(profile_for(context.user_data), last['glucose'],
+                            last['fasting'], title="آخرین آزمایش")
 
     await query.edit_message_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
 
 
+async def target_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from classifier import PROFILES, profile_for
+
+    query = update.callback_query
+    await query.answer()
+
+    if query.data.startswith("target_") and query.data != "target_menu":
+        key = query.data[len("target_"):]
+        if key in PROFILES:
+            context.user_data['target_profile'] = key
+
+    profile = profile_for(context.user_data)
+    text = f"🎯 **محدوده هدف قند خون**\n\nمحدوده فعلی: **{profile.name}**\n\n"
+    for fasting, title in ((True, "ناشتا"), (False, "غیرناشتا")):
+        table = profile.table(fasting)
+        text += (f"• {title}: هدف {table.low_below} تا {table.normal_max} mg/dL، "
+                 f"بسیار بالا بیشتر از {table.elevated_max}\n")
+    text += "\nتحلیل آزمایش‌ها و گزارش‌ها بر اساس این محدوده انجام می‌شود."
+
+    await query.edit_message_text(
+        text, reply_markup=get_target_profiles_keyboard(profile.key),
+        parse_mode=ParseMode.MARKDOWN)
+
+
+async def reminder_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+
+    if query.data == "reminder_off":
+        context.user_data.pop(REMINDER_TIME_KEY, None)
+    elif query.data.startswith("reminder_") and query.data[len("reminder_"):] in REMINDER_TIMES:
+        context.user_data[REMINDER_TIME_KEY] = query.data[len("reminder_"):]
+    elif query.data == "nudge_on":
+        context.user_data[NUDGE_KEY] = True
+    elif query.data == "nudge_off":
+        context.user_data.pop(NUDGE_KEY, None)
+    reminder_scheduler.apply_settings(update.effective_user.id, context.user_data)
+
+    reminder_time = context.user_data.get(REMINDER_TIME_KEY)
+    nudge = bool(context.user_data.get(NUDGE_KEY))
+    text = "⏰ **یادآورها**\n\n"
+    text += f"• یادآور روزانه آزمایش: **{reminder_time or 'خاموش'}**\n"
+    text += f"• یادآوری ساعت {NUDGE_TIME} اگر امروز آزمایشی ثبت نشده باشد: **{'روشن' if nudge else 'خاموش'}**\n\n"
+    text += "ساعت یادآور روزانه را انتخاب کنید:"
+
+    await query.edit_message_text(
+        text, reply_markup=get_reminders_keyboard(reminder_time, nudge),
+        parse_mode=ParseMode.MARKDOWN)
+
+
 async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
@@ -639,16 +916,103 @@ async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 3. **گزارش ماهانه** - گزارش‌های یک ماه خاص
 4. **لیست آزمایش‌ها** - مشاهده آخرین آزمایش‌ها
 5. **آمار کلی** - آمار کلی کاربر
+6. **یادآورها** - یادآور روزانه آزمایش و یادآوری روزهای بدون آزمایش
 
 📊 **گزارش ماهانه شامل:**
 • نمودار گرافیکی
 • فایل اکسل برای چاپ
+• فایل PDF چندصفحه‌ای
 • گزارش متنی کامل
 
+📦 **خروجی کامل:** همه آزمایش‌ها در یک فایل CSV فشرده (قابل ورود دوباره)
+
+📥 **ورود اطلاعات قبلی:**
+فایل CSV یا اکسل (xlsx) را ارسال کنید. ستون‌های لازم: تاریخ (شمسی یا میلادی) و قند خون؛ ستون‌های ساعت، ناشتا، علائم و یادداشت اختیاری هستند.
+
 برای شروع، «ثبت آزمایش جدید» را انتخاب کنید."""
 
     await query.edit_message_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
 
+# ==================== IMPORT / EXPORT HANDLERS ====================
+
+
+async def export_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+
+    user_id = update.effective_user.id
+    await query.edit_message_text("⏳ در حال آماده‌سازی خروجی کامل...")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export.csv.gz")
+            # Reads the store directly: export pages would only crowd the
+            # cache. Through write-behind, so queued tests are flushed first
+            count = await asyncio.to_thread(
+                export_csv_gzip, write_behind_db or db, user_id, path, EXPORT_PAGE_SIZE)
+            if count == 0:
+                await query.edit_message_text("❌ هیچ آزمایشی ثبت نشده است.", reply_markup=get_main_menu())
+                return
+
+            today = jdatetime.date.today().strftime("%Y_%m_%d")
+            with open(path, "rb") as document:
+                await context.bot.send_document(
+                    chat_id=user_id,
+                    document=document,
+                    filename=f"تاریخچه_قند_خون_{today}.csv.gz",
+                    caption=f"📦 خروجی کامل - {count} آزمایش"
+                )
+    except ExportIncomplete as e:
+        logger.error(f"Error exporting tests: {e}")
+        await query.edit_message_text("❌ خطا در خواندن آزمایش‌ها، لطفاً دوباره تلاش کنید.", reply_markup=get_main_menu())
+        return
+
+    await query.edit_message_text(f"✅ خروجی کامل ({count} آزمایش) ارسال شد.", reply_markup=get_main_menu())
+
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    document = update.message.document
+
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text("❌ حجم فایل بیش از ۲۰ مگابایت است.")
+        return
+
+    progress = await update.message.reply_text("⏳ در حال دریافت فایل...")
+
+    async def report_progress(summary: ImportSummary) -> None:
+        await progress.edit_text(f"⏳ در حال ثبت... {summary.imported} آزمایش ثبت شد")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "upload")
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_drive(path)
+            await progress.edit_text("⏳ در حال ثبت...")
+            summary = await import_file(
+                async_db, update.effective_user.id, path, document.file_name or "",
+                chunk_size=IMPORT_CHUNK_SIZE, on_progress=report_progress)
+    except InvalidImportFile:
+        await progress.edit_text(
+            "❌ ستون‌های «تاریخ» و «قند خون» در سطر اول فایل پیدا نشد.",
+            reply_markup=get_main_menu())
+        return
+    except Exception as e:
+        logger.error(f"Error importing file: {e}")
+        await progress.edit_text("❌ خطا در خواندن فایل!", reply_markup=get_main_menu())
+        return
+
+    text = f"✅ **{summary.imported}** آزمایش ثبت شد."
+    if summary.duplicates:
+        text += f"\nℹ️ {summary.duplicates} آزمایش قبلاً ثبت شده بود و تکرار نشد."
+    if summary.skipped:
+        lines = "، ".join(str(number) for number in summary.skipped_lines)
+        text += f"\n⚠️ {summary.skipped} سطر نامعتبر نادیده گرفته شد (سطرهای {lines}"
+        text += " و ...)" if summary.skipped > len(summary.skipped_lines) else ")"
+    if summary.failed:
+        text += "\n❌ ذخیره‌سازی بقیه سطرها با خطا مواجه شد؛ فایل را دوباره ارسال کنید."
+
+    await progress.edit_text(text, reply_markup=get_main_menu(), parse_mode=ParseMode.MARKDOWN)
+
 # ==================== TEXT MESSAGE HANDLERS ====================
 
 
@@ -663,14 +1027,149 @@ async def handle_start_text(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def handle_help_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await help_command(update, context)
 
-# ==================== MAIN FUNCTION ====================
+# ==================== BACKGROUND JOBS ====================
 
 
-def main() -> None:
-    print("🤖 ربات مدیریت قند خون در حال راه‌اندازی...")
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user:
+        activity_tracker.touch(update.effective_user.id)
+
+
+async def precompute_reports(context: ContextTypes.DEFAULT_TYPE) -> None:
+    precomputer = ReportPrecomputer(
+        async_db, activity_tracker, context.application.user_data.get,
+        active_window=PRECOMPUTE_ACTIVE_DAYS * 24 * 3600,
+        concurrency=PRECOMPUTE_CONCURRENCY)
+    count = await precomputer.run()
+    logger.info(f"Precomputed reports for {count} users")
+
+
+async def log_metrics(context: ContextTypes.DEFAULT_TYPE) -> None:
+    metrics = context.bot.rate_limiter.metrics()
+    lanes = "; ".join(
+        f"{name}: {lane['waiting']} waiting, {lane['sent']} sent, "
+        f"wait avg {lane['avg_wait']:.2f}s max {lane['max_wait']:.2f}s"
+        for name, lane in metrics['lanes'].items())
+    logger.info(f"Outgoing messages - {lanes}; {metrics['retry_after']} flood waits, "
+                f"paused for {metrics['paused_for']:.1f}s")
+    cache = cached_db.cache.stats()
+    logger.info(f"Test cache - {cache['hits']} hits, {cache['misses']} misses "
+                f"({cache['hit_rate']:.0%}), {cache['users']} users held")
+
+
+async def deliver_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
+    due = reminder_scheduler.due(datetime.now(BOT_TIMEZONE))
+    if not due:
+        return
+
+    async def send_reminder(user_id: int) -> bool:
+        await context.bot.send_message(
+            user_id, "⏰ **یادآوری:** وقت آزمایش قند خون است!",
+            reply_markup=get_reminder_message_keyboard(), parse_mode=ParseMode.MARKDOWN,
+            rate_limit_args=BACKGROUND)
+        return True
+
+    async def send_nudge(user_id: int) -> bool:
+        if await has_test_today(async_db, user_id, BOT_TIMEZONE):
+            return False
+        await context.bot.send_message(
+            user_id, "📝 امروز هنوز آزمایشی ثبت نکرده‌اید.",
+            reply_markup=get_reminder_message_keyboard(),
+            rate_limit_args=BACKGROUND)
+        return True
+
+    for kind, send in ((TEST_REMINDER, send_reminder), (NO_READING_NUDGE, send_nudge)):
+        if kind not in due:
+            continue
+        sent, blocked = await send_in_batches(
+            due[kind], send, REMINDER_BATCH_SIZE, REMINDER_BATCH_INTERVAL)
+        # Users who blocked the bot get no more reminders
+        for user_id in blocked:
+            user_data = context.application.user_data.get(user_id)
+            if user_data is not None:
+                user_data.pop(REMINDER_TIME_KEY, None)
+                user_data.pop(NUDGE_KEY, None)
+            reminder_scheduler.apply_settings(user_id, user_data)
+        if blocked:
+            context.application.mark_data_for_update_persistence(user_ids=blocked)
+        logger.info(f"Sent {sent} of {len(due[kind])} due {kind} reminders")
+
+# ==================== MAIN FUNCTION ====================
 
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+
+async def post_init(application: Application) -> None:
+    # user_data is loaded from persistence by now
+    reminder_scheduler.load(application.user_data)
+
+
+async def post_shutdown(application: Application) -> None:
+    chart_pool.shutdown()
+    if write_behind_db:
+        write_behind_db.stop()
+    async_db.shutdown()
+
+
+def build_application(update_queue_size: Optional[int] = None,
+                      use_updater: bool = True) -> Application:
+    """Create the Application and register all handlers"""
+    builder = Application.builder().token(
+        BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+
+    # Handle different users' updates in parallel, each user's in order.
+    # The processor bounds the updates in flight and the queue is bounded
+    # too; the webhook answers 503 while either is full.
+    processor = PerUserUpdateProcessor(
+        max_concurrent_updates=int(
+            os.environ.get("MAX_CONCURRENT_UPDATES", "16")),
+        max_pending_updates=int(os.environ.get("MAX_PENDING_UPDATES", "256")))
+    if update_queue_size is None:
+        update_queue_size = int(os.environ.get("UPDATE_QUEUE_SIZE", "256"))
+    builder = builder.concurrent_updates(processor).update_queue(
+        asyncio.Queue(maxsize=update_queue_size))
+
+    # Keep conversation state and user_data across restarts
+    persistence_path = os.environ.get("PERSISTENCE_DB", "bot_state.db")
+    if persistence_path:
+        builder = builder.persistence(SQLitePersistence(
+            persistence_path,
+            update_interval=float(os.environ.get("PERSISTENCE_INTERVAL", "10"))))
+
+    # Pace outgoing messages per chat and overall; interactive replies
+    # go ahead of background sends
+    builder = builder.rate_limiter(PriorityRateLimiter(
+        overall_rate=float(os.environ.get("SEND_RATE_OVERALL", "30")),
+        private_rate=float(os.environ.get("SEND_RATE_PER_CHAT", "1")),
+        max_retries=int(os.environ.get("SEND_MAX_RETRIES", "2"))))
+
+    if not use_updater:
+        builder = builder.updater(None)
+
+    # Optional self-hosted Bot API server (also used by the benchmarks)
+    api_url = os.environ.get("TELEGRAM_API_URL")
+    if api_url:
+        builder = builder.base_url(f"{api_url}/bot")
+
+    application = builder.build()
+
+    # Record who is active before any other handler runs
+    application.add_handler(TypeHandler(Update, track_activity), group=-1)
+
+    # Needs the job-queue extra; without it reports are only made on demand
+    if application.job_queue:
+        application.job_queue.run_daily(
+            precompute_reports,
+            time=dtime(hour=PRECOMPUTE_HOUR, tzinfo=BOT_TIMEZONE),
+            name="precompute_reports")
+        # One job for every user's reminders, at the start of each minute
+        application.job_queue.run_repeating(
+            deliver_reminders, interval=60,
+            first=60 - datetime.now().second, name="deliver_reminders")
+        if METRICS_LOG_INTERVAL > 0:
+            application.job_queue.run_repeating(
+                log_metrics, interval=METRICS_LOG_INTERVAL, name="log_metrics")
+    else:
+        logger.warning("JobQueue unavailable, reports will not be precomputed "
+                       "and reminders will not be sent")
 
     # Add conversation handler
     conv_handler = ConversationHandler(
@@ -700,6 +1199,8 @@ def main() -> None:
             CallbackQueryHandler(cancel_conversation, pattern='^cancel$'),
             CommandHandler('cancel', cancel_conversation)
         ],
+        name="glucose_conversation",
+        persistent=True,
     )
 
     # Add handlers
@@ -715,18 +1216,89 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(
         select_month, pattern='^month_'))
     application.add_handler(CallbackQueryHandler(
-        generate_report, pattern='^(chart|excel|text|back_months)$'))
+        generate_report, pattern='^(chart|excel|pdf|text|back_months)$'))
     application.add_handler(CallbackQueryHandler(
-        list_tests, pattern='^list_tests$'))
+        list_tests, pattern='^(list_tests|tests_[no]_.+)$'))
     application.add_handler(CallbackQueryHandler(
         overall_stats, pattern='^overall_stats$'))
+    application.add_handler(CallbackQueryHandler(
+        target_menu, pattern='^target_'))
+    application.add_handler(CallbackQueryHandler(
+        export_all, pattern='^export_all$'))
+    application.add_handler(CallbackQueryHandler(
+        reminder_menu, pattern='^(reminder_|nudge_(on|off)$)'))
     application.add_handler(CallbackQueryHandler(show_help, pattern='^help$'))
     application.add_handler(CallbackQueryHandler(start, pattern='^main_menu$'))
 
+    # Add bulk import handler
+    application.add_handler(MessageHandler(
+        filters.Document.FileExtension("csv") | filters.Document.FileExtension("xlsx"),
+        import_document))
+
     # Add text message handlers
     application.add_handler(MessageHandler(
         filters.TEXT & filters.Regex(r'^راهنما$'), handle_help_text))
 
+    return application
+
+
+def start_background_services() -> None:
+    # Fork the chart workers before any other threads start
+    chart_pool.start()
+
+    if os.environ.get("DB_WARM_UP", "1") == "1":
+        db.warm_up()
+
+    # Replay journaled tests left over from the last run
+    if write_behind_db:
+        write_behind_db.start()
+
+
+def create_webhook_app():
+    """Start the bot in webhook mode and return its WSGI app
+
+    Serve it from a single process (gunicorn --workers 1, see Procfile):
+    all bot state is per process, see WebhookBridge.
+    """
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL must be set for webhook mode")
+
+    start_background_services()
+
+    bridge = WebhookBridge(
+        build_application,
+        webhook_url=WEBHOOK_URL,
+        secret_token=os.environ.get(
+            "WEBHOOK_SECRET") or default_secret_token(BOT_TOKEN),
+        queue_size=int(os.environ.get("WEBHOOK_QUEUE_SIZE", "256")))
+    bridge.start()
+    return create_app(bridge)
+
+
+def __getattr__(name: str):
+    # "main:app" (see Procfile) is built on first access, so importing
+    # this module for polling never starts the webhook server
+    if name == "app":
+        global app
+        app = create_webhook_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main() -> None:
+    print("🤖 ربات مدیریت قند خون در حال راه‌اندازی...")
+
+    if BOT_MODE == "webhook":
+        # Development server; use gunicorn with main:app in production
+        print("🌐 استفاده از webhook...")
+        create_webhook_app().run(
+            host="0.0.0.0", port=int(os.environ.get("PORT", "8443")))
+        return
+
+    start_background_services()
+
+    application = build_application()
+
     print("🔄 استفاده از polling...")
     print("✅ ربات آماده است! به تلگرام بروید و ربات را استارت کنید.")
 
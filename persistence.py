@@ -0,0 +1,192 @@
+import copy
+import json
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+ConversationKey = Tuple[int, ...]
+ConversationDict = Dict[ConversationKey, object]
+
+
+class SQLitePersistence(BasePersistence):
+    """Stores user_data and conversation states in a local SQLite file.
+
+    update_* calls only record a copy of the latest value per key in
+    memory, so the handler path never waits on disk. Pending changes are written in one
+    transaction shortly after each persistence run (flush_delay seconds),
+    and on shutdown via flush(). The Application already coalesces
+    updates between runs (update_interval), so every user is written at
+    most once per run.
+    """
+
+    def __init__(self, path: str, update_interval: float = 10,
+                 flush_delay: float = 1):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval)
+        self.path = path
+        self.flush_delay = flush_delay
+        self.flush_count = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="persistence")
+        # Latest pending value per key; None marks a deletion
+        self._pending_user_data: Dict[int, Optional[Dict[Any, Any]]] = {}
+        self._pending_conversations: Dict[Tuple[str, str], Optional[object]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS user_data ("
+                "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, "
+                "PRIMARY KEY (name, key))")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # ---- loading ----
+
+    def _load_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT user_id, data FROM user_data").fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def _load_conversations(self, name: str) -> ConversationDict:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return await self._run(self._load_user_data)
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        return await self._run(self._load_conversations, name)
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    # ---- recording ----
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(
+            self.flush_delay, lambda: asyncio.ensure_future(self._flush_pending()))
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        # data is the Application's live dict, which handlers keep changing
+        # while _write serialises the pending values in a worker thread
+        self._pending_user_data[user_id] = copy.deepcopy(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key: ConversationKey,
+                                  new_state: Optional[object]) -> None:
+        self._pending_conversations[(name, json.dumps(key))] = copy.deepcopy(new_state)
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    # ---- writing ----
+
+    def _take_pending(self):
+        user_data, self._pending_user_data = self._pending_user_data, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        return user_data, conversations
+
+    def _write(self, user_data: Dict[int, Optional[Dict[Any, Any]]],
+               conversations: Dict[Tuple[str, str], Optional[object]]) -> None:
+        if not user_data and not conversations:
+            return
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+                    [(user_id, json.dumps(data, ensure_ascii=False))
+                     for user_id, data in user_data.items() if data is not None])
+                connection.executemany(
+                    "DELETE FROM user_data WHERE user_id = ?",
+                    [(user_id,) for user_id, data in user_data.items() if data is None])
+                connection.executemany(
+                    "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                    [(name, key, json.dumps(state))
+                     for (name, key), state in conversations.items() if state is not None])
+                connection.executemany(
+                    "DELETE FROM conversations WHERE name = ? AND key = ?",
+                    [(name, key) for (name, key), state in conversations.items() if state is None])
+            self.flush_count += 1
+
+    async def _flush_pending(self) -> None:
+        self._flush_handle = None
+        user_data, conversations = self._take_pending()
+        try:
+            await self._run(self._write, user_data, conversations)
+        except Exception as e:
+            print(f"Error writing persistence: {e}")
+            # Put the batch back unless newer values arrived meanwhile
+            for user_id, data in user_data.items():
+                self._pending_user_data.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self._pending_conversations.setdefault(key, state)
+            self._schedule_flush()
+
+    async def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        user_data, conversations = self._take_pending()
+        await self._run(self._write, user_data, conversations)
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Mapping, Optional, TYPE_CHECKING
+
+import jdatetime
+
+# classifier imports numpy; it is imported where it is used so that
+# importing this module (and main) stays cheap at startup
+if TYPE_CHECKING:
+    from classifier import TargetProfile
+from jalali import JALALI_MONTH_NAMES
+from render_cache import render_cache
+from render_pool import chart_pool, RenderQueueFull
+from reports import report_generator
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """When each recently seen user last sent an update
+
+    Only the max_users most recent users are kept. Updated from handlers
+    on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_users: int = 5000):
+        self.max_users = max_users
+        self._last_seen: "OrderedDict[int, float]" = OrderedDict()
+
+    def touch(self, user_id: int) -> None:
+        self._last_seen[user_id] = time.time()
+        self._last_seen.move_to_end(user_id)
+        while len(self._last_seen) > self.max_users:
+            self._last_seen.popitem(last=False)
+
+    def active_since(self, since: float) -> List[int]:
+        """Users seen at or after the timestamp since, most recent first"""
+        users = []
+        for user_id, last_seen in reversed(self._last_seen.items()):
+            if last_seen < since:
+                break
+            users.append(user_id)
+        return users
+
+
+# Rough render_cache bytes one user's precomputed reports take: the
+# monthly chart (about 400 KB for a month of three readings a day) and
+# the two text reports
+USER_RENDER_SIZE = 420 * 1024
+RENDERS_PER_USER = 3
+
+
+def text_report_key(tests: List[Dict], report_type: str, profile: "TargetProfile") -> str:
+    return render_cache.make_key(f"text:{profile.key}:{report_type}", tests)
+
+
+def render_text_report(tests: List[Dict], report_type: str, profile: "TargetProfile") -> List[str]:
+    """The text report's chunks without the date stamp, from render_cache
+    when already made"""
+    key = text_report_key(tests, report_type, profile)
+    entry = render_cache.get(key)
+    if entry and entry.data is not None:
+        return json.loads(entry.data)
+
+    chunks = list(report_generator.create_text_report_chunks(
+        tests, report_type, profile, stamped=False))
+    render_cache.put_bytes(key, json.dumps(chunks, ensure_ascii=False).encode())
+    return chunks
+
+
+def get_text_report(tests: List[Dict], report_type: str, profile: "TargetProfile") -> List[str]:
+    """The text report's chunks, stamped with the time they are sent"""
+    chunks = render_text_report(tests, report_type, profile)
+    if not tests:
+        return chunks
+    # Stamped here rather than cached, so a cached report keeps serving
+    # on later days while its tests are unchanged
+    return report_generator.stamp_text_report(chunks)
+
+
+def monthly_report_type(month: int) -> str:
+    return f"ماهانه ({JALALI_MONTH_NAMES[month - 1]})"
+
+
+class ReportPrecomputer:
+    """Renders recently active users' reports ahead of time
+
+    For each user seen within active_window seconds this makes the weekly
+    text report and the current month's text report and chart, storing
+    them in render_cache under the keys weekly_report and generate_report
+    look up. The keys hash the tests, so a user who adds or deletes a
+    test afterwards gets a fresh render instead of a stale one.
+
+    At most concurrency users are processed at a time, and each chart
+    goes through chart_pool like a live request would; when the pool is
+    full the chart is skipped rather than waiting for a slot.
+
+    Only the max_users most recently active users are processed. By
+    default that is as many as render_cache can hold, so late renders
+    do not evict early ones (or live ones) before they are used.
+    """
+
+    def __init__(self, database, tracker: ActivityTracker,
+                 user_data: Callable[[int], Optional[Mapping]],
+                 active_window: float = 7 * 24 * 3600, concurrency: int = 2,
+                 max_users: Optional[int] = None):
+        self.database = database
+        self.tracker = tracker
+        self.user_data = user_data
+        self.active_window = active_window
+        self.concurrency = concurrency
+        if max_users is None:
+            max_users = min(render_cache.max_bytes // USER_RENDER_SIZE,
+                            render_cache.max_entries // RENDERS_PER_USER)
+        self.max_users = max_users
+
+    async def run(self) -> int:
+        """Precompute for recently active users; returns how many"""
+        users = self.tracker.active_since(time.time() - self.active_window)
+        users = users[:self.max_users]
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def precompute(user_id: int) -> bool:
+            async with slots:
+                try:
+                    await self.precompute_user(user_id)
+                    return True
+                except Exception as e:
+                    logger.warning(f"Precomputing reports for {user_id} failed: {e}")
+                    return False
+
+        done = await asyncio.gather(*(precompute(user_id) for user_id in users))
+        return sum(done)
+
+    async def precompute_user(self, user_id: int) -> None:
+        from classifier import profile_for
+
+        profile = profile_for(self.user_data(user_id))
+
+        weekly = await self.database.get_weekly_stats(user_id)
+        if weekly['tests']:
+            render_text_report(weekly['tests'], "هفتگی", profile)
+
+        today = jdatetime.date.today()
+        tests = await self.database.get_monthly_tests(user_id, today.year, today.month)
+        if not tests:
+            return
+        render_text_report(tests, monthly_report_type(today.month), profile)
+
+        chart_key = render_cache.make_key("chart", tests)
+        if render_cache.get(chart_key) is None:
+            try:
+                chart = await chart_pool.render_monthly_chart(tests, wait=False)
+            except RenderQueueFull:
+                return
+            if chart:
+                render_cache.put_bytes(chart_key, chart)
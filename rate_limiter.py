@@ -0,0 +1,214 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, passed to bot methods as rate_limit_args; lower goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one is now"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def reserve(self) -> float:
+        """Take a token now or in the future; seconds until it is usable
+
+        Tokens may go negative, so callers get increasing delays and are
+        served in the order they called.
+        """
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+@dataclass
+class LaneMetrics:
+    # Requests waiting for tokens now, and totals for those already sent
+    waiting: int = 0
+    sent: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """Token-bucket limiter for outgoing Bot API requests
+
+    A request addressed to a chat takes a token from that chat's bucket
+    (private_rate per second for users, group_rate for groups and
+    channels) and then one from the global bucket (overall_rate per
+    second). Global tokens go to waiting requests in lane order, so
+    interactive replies overtake queued background sends such as
+    reminders; within a lane requests are served in arrival order.
+    rate_limit_args picks the lane: None or INTERACTIVE, or BACKGROUND.
+
+    On RetryAfter every request pauses for as long as Telegram asks and
+    the failed one is retried, up to max_retries times.
+    """
+
+    def __init__(self, overall_rate: float = 30, private_rate: float = 1,
+                 private_burst: float = 3, group_rate: float = 20 / 60,
+                 group_burst: float = 20, max_retries: int = 2,
+                 max_chat_buckets: int = 4096):
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self.retry_after_count = 0
+        self.lanes = {lane: LaneMetrics() for lane in LANE_NAMES}
+        self._global = TokenBucket(overall_rate, overall_rate)
+        self._chats: "OrderedDict[Union[int, str], TokenBucket]" = OrderedDict()
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._changed: Optional[asyncio.Condition] = None
+        self._paused_until = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth and wait times per lane, for /health"""
+        lanes = {}
+        for lane, metrics in self.lanes.items():
+            lanes[LANE_NAMES[lane]] = {
+                "waiting": metrics.waiting,
+                "sent": metrics.sent,
+                "avg_wait": metrics.total_wait / metrics.sent if metrics.sent else 0.0,
+                "max_wait": metrics.max_wait,
+            }
+        return {"lanes": lanes, "retry_after": self.retry_after_count,
+                "paused_for": max(0.0, self._paused_until - time.monotonic())}
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Negative ids and @usernames are groups and channels
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            self._chats[chat_id] = bucket
+            # The least recently used chats' buckets have long refilled
+            while len(self._chats) > self.max_chat_buckets:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _take_chat_token(self, chat_id: Union[int, str]) -> None:
+        # Reserved rather than polled so a chat's messages keep their order
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _take_global_token(self, lane: int) -> None:
+        if self._changed is None:
+            # Created on first use so it belongs to the running event loop
+            self._changed = asyncio.Condition()
+        entry = (lane, next(self._sequence))
+        async with self._changed:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    # Only the first waiter in lane order may take a token
+                    timeout = None
+                    if self._waiters[0] == entry:
+                        timeout = self._global.delay()
+                        if timeout == 0:
+                            break
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._changed.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            self._global.take()
+            self._changed.notify_all()
+
+    async def _wait_for_pause(self) -> None:
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict, List[Dict]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict, List[Dict]]:
+        lane = rate_limit_args if rate_limit_args in LANE_NAMES else INTERACTIVE
+        metrics = self.lanes[lane]
+        chat_id = data.get("chat_id")
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+
+        for attempt in range(self.max_retries + 1):
+            queued = time.monotonic()
+            metrics.waiting += 1
+            try:
+                # Requests not addressed to a chat, such as answering a
+                # callback query, are not limited
+                if chat_id is not None:
+                    await self._take_chat_token(chat_id)
+                    await self._take_global_token(lane)
+                await self._wait_for_pause()
+            finally:
+                metrics.waiting -= 1
+
+            wait = time.monotonic() - queued
+            metrics.sent += 1
+            metrics.total_wait += wait
+            metrics.max_wait = max(metrics.max_wait, wait)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_count += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Flood limit hit on {endpoint}, pausing sends for {e.retry_after}s")
+                self._paused_until = max(self._paused_until,
+                                         time.monotonic() + e.retry_after + 0.1)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, tzinfo
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+from telegram.error import Forbidden
+
+logger = logging.getLogger(__name__)
+
+# Reminder kinds: a daily "time for your test" at the user's chosen time,
+# and a "no reading today" nudge sent only if no test was recorded today
+TEST_REMINDER = "test"
+NO_READING_NUDGE = "nudge"
+REMINDER_KINDS = (TEST_REMINDER, NO_READING_NUDGE)
+
+# user_data keys holding a user's settings: "HH:MM" or absent, and a flag
+REMINDER_TIME_KEY = "reminder_time"
+NUDGE_KEY = "nudge"
+
+MINUTES_PER_DAY = 24 * 60
+# Minutes a late tick looks back; older reminders are dropped, not sent late
+MAX_CATCH_UP = 15
+
+
+def parse_minute(time_str: str) -> int:
+    """Minute of the day for "HH:MM" """
+    hour, minute = time_str.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+class ReminderScheduler:
+    """Users with a reminder due, bucketed by kind and minute of the day
+
+    A single repeating job calls due() every minute and delivers what it
+    returns, instead of one JobQueue job (and one timer) per user, so a
+    scheduled reminder costs one set entry no matter how many users there
+    are. Buckets are rebuilt from persisted user_data at startup.
+    """
+
+    def __init__(self, nudge_minute: int):
+        self.nudge_minute = nudge_minute
+        self._buckets: Dict[Tuple[str, int], Set[int]] = defaultdict(set)
+        self._minutes: Dict[Tuple[str, int], int] = {}
+        self._last_minute: Optional[int] = None
+
+    def schedule(self, kind: str, user_id: int, minute: Optional[int]) -> None:
+        """Move a user's reminder of kind to minute, or cancel it with None"""
+        previous = self._minutes.pop((kind, user_id), None)
+        if previous is not None:
+            bucket = self._buckets[(kind, previous)]
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[(kind, previous)]
+        if minute is not None:
+            self._minutes[(kind, user_id)] = minute
+            self._buckets[(kind, minute)].add(user_id)
+
+    def apply_settings(self, user_id: int, user_data: Optional[Mapping]) -> None:
+        """Schedule a user's reminders from their user_data settings"""
+        user_data = user_data or {}
+        reminder_time = user_data.get(REMINDER_TIME_KEY)
+        self.schedule(TEST_REMINDER, user_id,
+                      parse_minute(reminder_time) if reminder_time else None)
+        self.schedule(NO_READING_NUDGE, user_id,
+                      self.nudge_minute if user_data.get(NUDGE_KEY) else None)
+
+    def load(self, all_user_data: Mapping[int, Mapping]) -> None:
+        for user_id, user_data in all_user_data.items():
+            self.apply_settings(user_id, user_data)
+
+    def due(self, now: datetime) -> Dict[str, List[int]]:
+        """Users whose reminders fell due since the previous call, by kind
+
+        Minutes skipped because a tick ran late are included, up to
+        MAX_CATCH_UP of them; a second call in the same minute returns
+        nothing.
+        """
+        minute = now.hour * 60 + now.minute
+        if self._last_minute is None:
+            elapsed = 1
+        else:
+            elapsed = min((minute - self._last_minute) % MINUTES_PER_DAY, MAX_CATCH_UP)
+        self._last_minute = minute
+
+        due: Dict[str, List[int]] = {}
+        for kind in REMINDER_KINDS:
+            users = []
+            for back in range(elapsed):
+                users.extend(self._buckets.get((kind, (minute - back) % MINUTES_PER_DAY), ()))
+            if users:
+                due[kind] = users
+        return due
+
+
+async def has_test_today(database, user_id: int, tz: tzinfo) -> bool:
+    """Whether the user's latest test was recorded today in time zone tz
+
+    created_at carries BOT_TIMEZONE's offset (see
+    StorageBackend.build_test_row); rows stored before that are naive
+    server-local time. Either way it is converted to tz before comparing,
+    so a server running in UTC does not end the users' day at its midnight.
+    """
+    latest = await database.get_user_tests_page(user_id, 1)
+    if not latest:
+        return False
+    # A naive timestamp is taken as server-local by astimezone
+    created_at = datetime.fromisoformat(latest[0]['created_at']).astimezone(tz)
+    return created_at.date() == datetime.now(tz).date()
+
+
+async def send_in_batches(user_ids: List[int], send: Callable[[int], Awaitable[bool]],
+                          batch_size: int = 25, interval: float = 1.0) -> Tuple[int, List[int]]:
+    """Call send(user_id) for every user, batch_size at a time
+
+    Each batch is sent concurrently and followed by interval seconds of
+    quiet, keeping bursts under Telegram's broadcast limit. send returns
+    whether it sent anything. Returns how many messages were sent and the
+    users who have blocked the bot.
+    """
+    sent = 0
+    blocked = []
+    for start in range(0, len(user_ids), batch_size):
+        if start:
+            await asyncio.sleep(interval)
+        batch = user_ids[start:start + batch_size]
+        results = await asyncio.gather(*(send(user_id) for user_id in batch),
+                                       return_exceptions=True)
+        for user_id, result in zip(batch, results):
+            if isinstance(result, Forbidden):
+                blocked.append(user_id)
+            elif isinstance(result, Exception):
+                logger.warning(f"Reminder to {user_id} failed: {result}")
+            elif result:
+                sent += 1
+    return sent, blocked
@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+from reports import REPORT_VERSION
+
+
+@dataclass
+class RenderEntry:
+    data: Optional[bytes] = None
+    file_id: Optional[str] = None
+
+
+class RenderCache:
+    """Content-addressed cache of rendered reports.
+
+    Entries are keyed by a hash of the input tests, the output format and
+    the report generator version, so any change to the month's tests or to
+    the rendering code yields a new key. Rendered bytes are kept until a
+    Telegram file_id is known for them; after that only the file_id is
+    kept, since re-sending by file_id needs no upload.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024,
+                 max_entries: int = 10000, version: str = REPORT_VERSION):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.version = version
+        self.size = 0
+        self._entries: "OrderedDict[str, RenderEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, fmt: str, tests: List[Dict]) -> str:
+        payload = json.dumps(
+            sorted(tests, key=lambda t: (str(t.get('created_at')), str(t.get('id')))),
+            sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256()
+        digest.update(f"{self.version}:{fmt}:".encode())
+        digest.update(payload.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[RenderEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        with self._lock:
+            entry = self._entries.setdefault(key, RenderEntry())
+            if entry.data is not None:
+                self.size -= len(entry.data)
+            entry.data = data
+            self.size += len(data)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def put_file_id(self, key: str, file_id: str) -> None:
+        with self._lock:
+            entry = self._entries.setdefault(key, RenderEntry())
+            entry.file_id = file_id
+            if entry.data is not None:
+                self.size -= len(entry.data)
+                entry.data = None
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def forget_file_id(self, key: str) -> None:
+        """Drop a file_id that Telegram no longer accepts"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.file_id = None
+                if entry.data is None:
+                    del self._entries[key]
+
+    def _evict(self) -> None:
+        while self._entries and (self.size > self.max_bytes
+                                 or len(self._entries) > self.max_entries):
+            _, entry = self._entries.popitem(last=False)
+            if entry.data is not None:
+                self.size -= len(entry.data)
+
+
+# Create global render cache instance
+render_cache = RenderCache(
+    max_bytes=int(os.environ.get("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    max_entries=int(os.environ.get("RENDER_CACHE_MAX_ENTRIES", "10000")))
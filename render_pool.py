@@ -0,0 +1,109 @@
+import os
+import asyncio
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
+
+
+class RenderQueueFull(Exception):
+    """Raised when a render could not be queued before the timeout"""
+
+
+# Modules the chart code imports, loaded ahead of the first request
+WARM_UP_MODULES = ("matplotlib.style", "matplotlib.figure",
+                   "matplotlib.backends.backend_agg", "jalali")
+
+
+def _init_worker() -> None:
+    # Pay matplotlib's import and font cache cost once per worker process
+    # instead of on the first chart request.
+    import matplotlib
+    matplotlib.use('Agg')
+    for name in WARM_UP_MODULES:
+        importlib.import_module(name)
+    from matplotlib import font_manager
+    font_manager.findfont('DejaVu Sans')
+
+
+def _ready() -> bool:
+    return True
+
+
+class ChartRenderPool:
+    """Renders charts in a pool of pre-warmed worker processes.
+
+    At most max_pending renders are queued or running at once; further
+    callers wait for a slot (backpressure) and give up with
+    RenderQueueFull after queue_timeout seconds. Background callers pass
+    wait=False to give up at once instead of queueing behind live requests.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, queue_timeout: float = 30):
+        if max_workers is None:
+            max_workers = int(os.environ.get(
+                "CHART_WORKERS", str(min(os.cpu_count() or 1, 4))))
+        if max_pending is None:
+            max_pending = int(os.environ.get(
+                "CHART_QUEUE_SIZE", str(max_workers * 2)))
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def start(self) -> None:
+        """Start and warm up the worker processes
+
+        Call this early at startup, before other threads are running, so
+        the workers are forked from a clean process. It does not wait for
+        the warm-up to finish.
+        """
+        if self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=_init_worker)
+        # Each submit spawns a worker while none is idle, so this brings
+        # up the whole pool and runs the initializer in every process.
+        for _ in range(self.max_workers):
+            self.executor.submit(_ready)
+
+    async def _submit(self, func, *args, wait: bool = True):
+        if self.executor is None:
+            self.start()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        if not wait and self._slots.locked():
+            raise RenderQueueFull(
+                f"{self.max_pending} renders already pending")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise RenderQueueFull(
+                f"{self.max_pending} renders already pending")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._slots.release()
+
+    async def render_monthly_chart(self, tests: List[Dict],
+                                   wait: bool = True) -> Optional[bytes]:
+        """Render ReportGenerator.create_monthly_chart in a worker process"""
+        from reports import ReportGenerator
+        return await self._submit(ReportGenerator.create_monthly_chart, tests, wait=wait)
+
+    async def render_pdf_report(self, tests: List[Dict],
+                                chart_image: Optional[bytes] = None) -> Optional[bytes]:
+        """Render ReportGenerator.create_pdf_report in a worker process"""
+        from reports import ReportGenerator
+        return await self._submit(ReportGenerator.create_pdf_report, tests, chart_image)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+# Create global chart render pool
+chart_pool = ChartRenderPool()
@@ -1,14 +1,23 @@
-from typing import List, Dict, Optional, Tuple
-import os
+from typing import Iterator, List, Dict, Optional
 import io
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib import font_manager
-import jdatetime
-from datetime import datetime
-from PIL import Image
-import matplotlib
-matplotlib.use('Agg')
+import re
+from functools import lru_cache
+
+# matplotlib, openpyxl, PIL, jdatetime, jalali, stats and classifier (numpy)
+# are imported inside the methods that use them so that importing this
+# module stays cheap at startup.
+
+# Bump whenever rendered output changes so cached renders are not reused
+REPORT_VERSION = "5"
+
+# Telegram's message length limit, and the longest symptoms and note a
+# text report shows; together they keep every test's block far below the
+# limit, so chunks never need to split one
+TEXT_CHUNK_LENGTH = 4096
+TEXT_SYMPTOMS_LENGTH = 100
+TEXT_NOTES_LENGTH = 500
+
+_MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
 
 
 class ReportGenerator:
@@ -19,86 +28,86 @@ class ReportGenerator:
             return None
 
         try:
+            import matplotlib.style
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from jalali import format_jalali_days
+
             # Sort tests by date
             tests_sorted = sorted(tests, key=lambda x: x['created_at'])
 
             # Prepare data
-            dates = []
-            glucose_values = []
-
-            for test in tests_sorted:
-                # Convert to Jalali date
-                gregorian_date = datetime.fromisoformat(
-                    test['created_at'].replace('Z', '+00:00'))
-                jalali_date = jdatetime.datetime.fromgregorian(
-                    datetime=gregorian_date)
-                dates.append(jalali_date.strftime("%d/%m"))
-                glucose_values.append(test['glucose'])
-
-            # Create figure with better styling
-            plt.style.use('seaborn-v0_8-darkgrid')
-            fig, ax = plt.subplots(figsize=(12, 7))
-
-            # Plot glucose values with gradient color
-            line = ax.plot(dates, glucose_values, marker='o', linewidth=3, markersize=10,
-                           color='#2E86AB', markerfacecolor='#FF6B6B', markeredgewidth=2)
-
-            # Fill under the line
-            ax.fill_between(dates, glucose_values, alpha=0.2, color='#2E86AB')
-
-            # Add horizontal lines for ranges with better styling
-            ranges = [
-                (70, 'green', 'حد پایین نرمال', '--'),
-                (100, 'blue', 'حد بالای نرمال ناشتا', '-.'),
-                (140, 'orange', 'حد بالای نرمال', ':'),
-                (200, 'red', 'حد خطر', '--')
-            ]
-
-            for value, color, label, linestyle in ranges:
-                ax.axhline(y=value, color=color, linestyle=linestyle,
-                           alpha=0.7, linewidth=2, label=label)
-
-            # Customize plot with better styling
-            ax.set_xlabel('📅 تاریخ (روز/ماه)', fontsize=14,
-                          fontweight='bold', labelpad=15)
-            ax.set_ylabel('🩸 میزان قند خون (mg/dL)', fontsize=14,
-                          fontweight='bold', labelpad=15)
-            ax.set_title('📊 نمودار ماهانه قند خون',
-                         fontsize=16, fontweight='bold', pad=25)
-
-            # Add grid
-            ax.grid(True, alpha=0.4, linestyle='--')
-
-            # Add legend with better positioning
-            ax.legend(loc='upper right', fontsize=10,
-                      framealpha=0.9, shadow=True)
-
-            # Rotate and style date labels
-            plt.xticks(rotation=45, fontsize=11)
-            plt.yticks(fontsize=11)
-
-            # Add value labels on points
-            for i, (date, value) in enumerate(zip(dates, glucose_values)):
-                ax.annotate(f'{value}', (date, value),
-                            textcoords="offset points",
-                            xytext=(0, 10),
-                            ha='center',
-                            fontsize=9,
-                            fontweight='bold')
-
-            # Adjust layout
-            plt.tight_layout()
-
-            # Add footer text
-            fig.text(0.5, 0.01, 'ربات مدیریت قند خون | ایجاد شده با matplotlib',
-                     ha='center', fontsize=10, alpha=0.7)
-
-            # Save to bytes
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=200, bbox_inches='tight',
-                        facecolor=fig.get_facecolor(), edgecolor='none')
-            plt.close(fig)
-            buf.seek(0)
+            dates = format_jalali_days(
+                (test['created_at'] for test in tests_sorted), "%d/%m")
+            glucose_values = [test['glucose'] for test in tests_sorted]
+
+            # Use the object-oriented Figure API rather than pyplot so no
+            # global figure state is shared between concurrent renders
+            with matplotlib.style.context('seaborn-v0_8-darkgrid'):
+                fig = Figure(figsize=(12, 7))
+                FigureCanvasAgg(fig)
+                ax = fig.add_subplot()
+
+                # Plot glucose values with gradient color
+                ax.plot(dates, glucose_values, marker='o', linewidth=3, markersize=10,
+                        color='#2E86AB', markerfacecolor='#FF6B6B', markeredgewidth=2)
+
+                # Fill under the line
+                ax.fill_between(dates, glucose_values,
+                                alpha=0.2, color='#2E86AB')
+
+                # Add horizontal lines for ranges with better styling
+                ranges = [
+                    (70, 'green', 'حد پایین نرمال', '--'),
+                    (100, 'blue', 'حد بالای نرمال ناشتا', '-.'),
+                    (140, 'orange', 'حد بالای نرمال', ':'),
+                    (200, 'red', 'حد خطر', '--')
+                ]
+
+                for value, color, label, linestyle in ranges:
+                    ax.axhline(y=value, color=color, linestyle=linestyle,
+                               alpha=0.7, linewidth=2, label=label)
+
+                # Customize plot with better styling
+                ax.set_xlabel('📅 تاریخ (روز/ماه)', fontsize=14,
+                              fontweight='bold', labelpad=15)
+                ax.set_ylabel('🩸 میزان قند خون (mg/dL)', fontsize=14,
+                              fontweight='bold', labelpad=15)
+                ax.set_title('📊 نمودار ماهانه قند خون',
+                             fontsize=16, fontweight='bold', pad=25)
+
+                # Add grid
+                ax.grid(True, alpha=0.4, linestyle='--')
+
+                # Add legend with better positioning
+                ax.legend(loc='upper right', fontsize=10,
+                          framealpha=0.9, shadow=True)
+
+                # Rotate and style date labels
+                ax.tick_params(axis='x', labelrotation=45, labelsize=11)
+                ax.tick_params(axis='y', labelsize=11)
+
+                # Add value labels on points
+                for date, value in zip(dates, glucose_values):
+                    ax.annotate(f'{value}', (date, value),
+                                textcoords="offset points",
+                                xytext=(0, 10),
+                                ha='center',
+                                fontsize=9,
+                                fontweight='bold')
+
+                # Adjust layout
+                fig.tight_layout()
+
+                # Add footer text
+                fig.text(0.5, 0.01, 'ربات مدیریت قند خون | ایجاد شده با matplotlib',
+                         ha='center', fontsize=10, alpha=0.7)
+
+                # Save to bytes
+                buf = io.BytesIO()
+                fig.savefig(buf, format='png', dpi=200, bbox_inches='tight',
+                            facecolor=fig.get_facecolor(), edgecolor='none')
+                buf.seek(0)
 
             return buf.read()
         except Exception as e:
@@ -106,101 +115,115 @@ class ReportGenerator:
             return None
 
     @staticmethod
-    def create_excel_report(tests: List[Dict]) -> Optional[bytes]:
-        """Create Excel report of tests"""
+    def create_excel_report(tests: List[Dict], profile=None) -> Optional[bytes]:
+        """Create Excel report of tests
+
+        Each test's status is labelled with profile (a TargetProfile,
+        standard ranges by default), classified in one batch.
+
+        Rows are streamed into an openpyxl write-only workbook, so no
+        intermediate copies of the data are built. Column widths and the
+        statistics row are computed before the first row is written,
+        because a write-only sheet needs its widths up front.
+        """
         if not tests:
             return None
 
         try:
-            # Prepare data for DataFrame
-            data = []
-            for test in tests:
-                gregorian_date = datetime.fromisoformat(
-                    test['created_at'].replace('Z', '+00:00'))
-                jalali_date = jdatetime.datetime.fromgregorian(
-                    datetime=gregorian_date)
-
-                data.append({
-                    'شناسه': test['id'],
-                    'تاریخ شمسی': test['shamsi_date'],
-                    'ساعت آزمایش': test['test_time'],
-                    'قند خون (mg/dL)': test['glucose'],
-                    'نوع آزمایش': 'ناشتا' if test['fasting'] else 'غیرناشتا',
-                    'علائم': test['symptoms'],
-                    'یادداشت': test.get('notes', ''),
-                    'تاریخ ثبت': gregorian_date.strftime("%Y-%m-%d %H:%M")
-                })
-
-            # Create DataFrame
-            df = pd.DataFrame(data)
-
-            # Add statistics row
-            if len(df) > 0:
-                stats_row = {
-                    'شناسه': 'آمار',
-                    'تاریخ شمسی': '',
-                    'ساعت آزمایش': '',
-                    'قند خون (mg/dL)': df['قند خون (mg/dL)'].mean(),
-                    'نوع آزمایش': '',
-                    'علائم': f"تعداد: {len(df)} | حداقل: {df['قند خون (mg/dL)'].min()} | حداکثر: {df['قند خون (mg/dL)'].max()}",
-                    'یادداشت': '',
-                    'تاریخ ثبت': ''
-                }
-                df = pd.concat([df, pd.DataFrame([stats_row])],
-                               ignore_index=True)
-
-            # Create Excel file in memory with styling
+            from openpyxl import Workbook
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.utils import get_column_letter
+            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+            from stats import compute_stats
+            from classifier import DEFAULT_PROFILE
+
+            profile = profile or DEFAULT_PROFILE
+            headers = ['شناسه', 'تاریخ شمسی', 'ساعت آزمایش', 'قند خون (mg/dL)',
+                       'نوع آزمایش', 'وضعیت', 'علائم', 'یادداشت', 'تاریخ ثبت']
+
+            levels = profile.classify_tests(tests).tolist()
+            labels = (profile.fasting.labels, profile.non_fasting.labels)
+
+            def row_values(test: Dict, level: int) -> tuple:
+                return (
+                    test['id'],
+                    test['shamsi_date'],
+                    test['test_time'],
+                    test['glucose'],
+                    'ناشتا' if test['fasting'] else 'غیرناشتا',
+                    labels[0 if test['fasting'] else 1][level],
+                    test['symptoms'],
+                    test.get('notes', ''),
+                )
+
+            stats = compute_stats(tests)
+
+            # Single pass: column widths
+            widths = [len(header) for header in headers]
+            # 'تاریخ ثبت' is always formatted as "%Y-%m-%d %H:%M"
+            widths[8] = max(widths[8], 16)
+            for test, level in zip(tests, levels):
+                for i, value in enumerate(row_values(test, level)):
+                    length = len(str(value)) if value is not None else 0
+                    if length > widths[i]:
+                        widths[i] = length
+
+            stats_values = ['آمار', '', '', round(stats.mean, 1), '', '',
+                            f"تعداد: {stats.count} | حداقل: {stats.min} | حداکثر: {stats.max}",
+                            f"انحراف معیار: {stats.std:.1f} | CV: {stats.cv:.1f}%",
+                            f"HbA1c تخمینی (GMI): {stats.gmi:.1f}%"]
+            for i, value in enumerate(stats_values):
+                widths[i] = max(widths[i], len(str(value)))
+
+            workbook = Workbook(write_only=True)
+            worksheet = workbook.create_sheet('آزمایش‌های قند خون')
+
+            # Auto-adjust columns width
+            for i, width in enumerate(widths, 1):
+                worksheet.column_dimensions[get_column_letter(i)].width = min(
+                    width + 4, 40)
+
+            # Define styles
+            header_font = Font(name='Arial', bold=True,
+                               size=12, color='FFFFFF')
+            header_fill = PatternFill(
+                start_color='2E86AB', end_color='2E86AB', fill_type='solid')
+            header_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                   top=Side(style='thin'), bottom=Side(style='thin'))
+            cell_alignment = Alignment(
+                horizontal='center', vertical='center', wrap_text=True)
+
+            # Styled header
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(worksheet, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+                cell.border = header_border
+                cell.alignment = cell_alignment
+                header_cells.append(cell)
+            worksheet.append(header_cells)
+
+            # Stream the tests
+            for test, level in zip(tests, levels):
+                worksheet.append(
+                    row_values(test, level) + (_created_at_minutes(test['created_at']),))
+
+            # Styled statistics row
+            stats_fill = PatternFill(
+                start_color='FFEAA7', end_color='FFEAA7', fill_type='solid')
+            stats_font = Font(bold=True)
+            stats_cells = []
+            for value in stats_values:
+                cell = WriteOnlyCell(worksheet, value=value)
+                cell.fill = stats_fill
+                cell.font = stats_font
+                stats_cells.append(cell)
+            worksheet.append(stats_cells)
+
+            # Create Excel file in memory
             output = io.BytesIO()
-
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(
-                    writer, sheet_name='آزمایش‌های قند خون', index=False)
-
-                # Get workbook and worksheet
-                workbook = writer.book
-                worksheet = writer.sheets['آزمایش‌های قند خون']
-
-                # Style the header
-                from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-
-                # Define styles
-                header_font = Font(name='Arial', bold=True,
-                                   size=12, color='FFFFFF')
-                header_fill = PatternFill(
-                    start_color='2E86AB', end_color='2E86AB', fill_type='solid')
-                cell_alignment = Alignment(
-                    horizontal='center', vertical='center', wrap_text=True)
-
-                # Apply styles to header
-                for col in range(1, len(df.columns) + 1):
-                    cell = worksheet.cell(row=1, column=col)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = cell_alignment
-
-                # Auto-adjust columns width
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 4, 40)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                # Style the statistics row
-                if len(df) > 0:
-                    stats_row_num = len(df) + 1
-                    stats_fill = PatternFill(
-                        start_color='FFEAA7', end_color='FFEAA7', fill_type='solid')
-                    for col in range(1, len(df.columns) + 1):
-                        cell = worksheet.cell(row=stats_row_num, column=col)
-                        cell.fill = stats_fill
-                        cell.font = Font(bold=True)
-
+            workbook.save(output)
             output.seek(0)
             return output.read()
         except Exception as e:
@@ -208,136 +231,266 @@ class ReportGenerator:
             return None
 
     @staticmethod
-    def create_pdf_report(tests: List[Dict]) -> Optional[bytes]:
-        """Create PDF report of tests (returns image for now, can be extended to actual PDF)"""
+    def create_pdf_report(tests: List[Dict], chart_image: Optional[bytes] = None) -> Optional[bytes]:
+        """Create a paginated PDF report of tests
+
+        The first page carries the summary and, if chart_image (PNG bytes
+        from create_monthly_chart) is given, the chart embedded as is. All
+        tests follow as a table over as many A4 pages as needed. A single
+        figure is reused for every table page and only its text changes.
+        """
         if not tests:
             return None
 
         try:
-            # Create a styled text report as image
-            from PIL import Image, ImageDraw, ImageFont
-
-            # Create image
-            img = Image.new('RGB', (800, 1200), color=(255, 255, 255))
-            draw = ImageDraw.Draw(img)
-
-            # Try to load font
-            try:
-                font_large = ImageFont.truetype("arial.ttf", 24)
-                font_medium = ImageFont.truetype("arial.ttf", 18)
-                font_small = ImageFont.truetype("arial.ttf", 14)
-            except:
-                font_large = ImageFont.load_default()
-                font_medium = ImageFont.load_default()
-                font_small = ImageFont.load_default()
-
-            # Draw header
-            draw.text((400, 50), "گزارش آزمایش‌های قند خون",
-                      font=font_large, fill=(0, 0, 0), anchor="mm")
-
-            # Draw statistics
-            glucose_values = [t['glucose'] for t in tests]
-            stats_text = f"""
-            آمار کلی:
-            • تعداد آزمایش‌ها: {len(tests)}
-            • میانگین قند خون: {sum(glucose_values)/len(glucose_values):.1f} mg/dL
-            • حداقل: {min(glucose_values)} mg/dL
-            • حداکثر: {max(glucose_values)} mg/dL
-            """
-
-            draw.text((400, 150), stats_text, font=font_medium,
-                      fill=(0, 0, 0), anchor="mm", align="center")
-
-            # Draw table header
-            y = 250
-            headers = ["تاریخ", "ساعت", "قند خون", "نوع", "علائم"]
-            for i, header in enumerate(headers):
-                draw.text((50 + i * 150, y), header, font=font_medium,
-                          fill=(46, 134, 171))
-
-            # Draw separator line
-            draw.line([(50, y + 30), (750, y + 30)], fill=(0, 0, 0), width=2)
-
-            # Draw test data
-            y += 50
-            for test in tests[:15]:  # Limit to 15 rows
-                draw.text((50, y), test['shamsi_date'],
-                          font=font_small, fill=(0, 0, 0))
-                draw.text((200, y), test['test_time'],
-                          font=font_small, fill=(0, 0, 0))
-                draw.text((350, y), str(test['glucose']),
-                          font=font_small, fill=(0, 0, 0))
-                draw.text((500, y), "ناشتا" if test['fasting'] else "غیرناشتا",
-                          font=font_small, fill=(0, 0, 0))
-                draw.text((650, y), test['symptoms'][:15],
-                          font=font_small, fill=(0, 0, 0))
-                y += 40
-
-            # Save to bytes
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.backends.backend_pdf import PdfPages
+            from stats import compute_stats
+
+            fonts = _pdf_fonts()
+            rows_per_page = PDF_ROWS_PER_PAGE
+            page_count = 1 + (len(tests) + rows_per_page - 1) // rows_per_page
+
+            stats = compute_stats(tests)
+
             buf = io.BytesIO()
-            img.save(buf, format='PNG')
-            buf.seek(0)
+            with PdfPages(buf, metadata={'Title': 'گزارش آزمایش‌های قند خون'}) as pdf:
+                # Summary page
+                fig = Figure(figsize=PDF_PAGE_SIZE)
+                FigureCanvasAgg(fig)
+                fig.text(0.5, 0.95, "گزارش آزمایش‌های قند خون", ha='center',
+                         va='top', fontproperties=fonts['title'])
+                stats_text = "\n".join([
+                    "آمار کلی:",
+                    f"• تعداد آزمایش‌ها: {stats.count}",
+                    f"• میانگین قند خون: {stats.mean:.1f} mg/dL",
+                    f"• حداقل: {stats.min} mg/dL",
+                    f"• حداکثر: {stats.max} mg/dL",
+                    f"• انحراف معیار: {stats.std:.1f} mg/dL (CV: {stats.cv:.1f}%)",
+                    f"• میانه: {stats.percentiles[50]:.0f} mg/dL",
+                    f"• HbA1c تخمینی (GMI): {stats.gmi:.1f}%",
+                    f"• آزمایش‌های ناشتا: {stats.fasting_count}",
+                    f"• آزمایش‌های غیرناشتا: {stats.non_fasting_count}",
+                    "توزیع مقادیر (mg/dL):",
+                ] + [f"• {label}: {share:.0f}%" for label, share in stats.range_shares()])
+                fig.text(0.5, 0.88, stats_text, ha='center', va='top',
+                         linespacing=1.45, fontproperties=fonts['body'])
+                if chart_image:
+                    from matplotlib.image import imread
+                    ax = fig.add_axes([0.06, 0.05, 0.88, 0.45])
+                    ax.imshow(imread(io.BytesIO(chart_image), format='png'))
+                    ax.set_axis_off()
+                _pdf_footer(fig, 1, page_count, fonts)
+                pdf.savefig(fig)
+
+                # Table pages
+                fig = Figure(figsize=PDF_PAGE_SIZE)
+                FigureCanvasAgg(fig)
+                headers = ["تاریخ", "ساعت", "قند خون", "نوع", "علائم"]
+                columns_x = [0.08, 0.26, 0.42, 0.58, 0.74]
+                for x, header in zip(columns_x, headers):
+                    fig.text(x, 0.94, header, va='top', color='#2E86AB',
+                             fontproperties=fonts['header'])
+                fig.add_artist(_pdf_rule(0.915))
+                columns = [fig.text(x, 0.90, "", va='top', linespacing=PDF_LINE_SPACING,
+                                    fontproperties=fonts['row'])
+                           for x in columns_x]
+                footer = _pdf_footer(fig, 2, page_count, fonts)
+
+                for page, start in enumerate(range(0, len(tests), rows_per_page), 2):
+                    rows = tests[start:start + rows_per_page]
+                    columns[0].set_text("\n".join(t['shamsi_date'] for t in rows))
+                    columns[1].set_text("\n".join(t['test_time'] for t in rows))
+                    columns[2].set_text("\n".join(str(t['glucose']) for t in rows))
+                    columns[3].set_text("\n".join(
+                        "ناشتا" if t['fasting'] else "غیرناشتا" for t in rows))
+                    columns[4].set_text("\n".join(
+                        (t['symptoms'] or '')[:20] for t in rows))
+                    footer.set_text(f"صفحه {page} از {page_count}")
+                    pdf.savefig(fig)
 
+            buf.seek(0)
             return buf.read()
         except Exception as e:
-            print(f"Error creating PDF/image report: {e}")
+            print(f"Error creating PDF report: {e}")
             return None
 
     @staticmethod
-    def create_text_report(tests: List[Dict], report_type: str = "هفتگی") -> str:
-        """Create formatted text report of tests"""
+    def create_text_report(tests: List[Dict], report_type: str = "هفتگی",
+                           profile=None) -> str:
+        """Create formatted text report of tests, as a single string"""
+        return "".join(ReportGenerator.create_text_report_chunks(tests, report_type, profile))
+
+    @staticmethod
+    def create_text_report_chunks(tests: List[Dict], report_type: str = "هفتگی",
+                                  profile=None, max_length: int = TEXT_CHUNK_LENGTH,
+                                  max_tests: Optional[int] = None,
+                                  stamped: bool = True) -> Iterator[str]:
+        """Yield the text report of tests in message-sized chunks
+
+        Every test is listed unless max_tests is given. Chunks break only
+        between sections and tests, and user-entered fields are escaped,
+        so each chunk is valid Markdown on its own. Status markers follow
+        profile (a TargetProfile, standard ranges by default). With
+        stamped=False the closing text_report_stamp() is left out, so the
+        chunks depend only on the tests and can be cached.
+        """
         if not tests:
-            return f"❌ هیچ آزمایشی برای گزارش {report_type} یافت نشد."
+            yield f"❌ هیچ آزمایشی برای گزارش {report_type} یافت نشد."
+            return
 
+        # Built in full before the first chunk is yielded, so a bad row
+        # turns into the error message rather than a half-sent report
         try:
-            report = "📊 " + "="*40 + "\n"
-            report += f"گزارش {report_type} آزمایش‌های قند خون\n"
-            report += "="*40 + "\n\n"
-
-            # Calculate statistics
-            glucose_values = [t['glucose'] for t in tests]
-            avg_glucose = sum(glucose_values) / len(glucose_values)
-            fasting_count = len([t for t in tests if t['fasting']])
-            non_fasting_count = len(tests) - fasting_count
-
-            # Add statistics
-            report += "📈 آمار کلی:\n"
-            report += "─"*30 + "\n"
-            report += f"• تعداد کل آزمایش‌ها: {len(tests)} عدد\n"
-            report += f"• میانگین قند خون: {avg_glucose:.1f} mg/dL\n"
-            report += f"• حداقل مقدار: {min(glucose_values)} mg/dL\n"
-            report += f"• حداکثر مقدار: {max(glucose_values)} mg/dL\n"
-            report += f"• آزمایش‌های ناشتا: {fasting_count} عدد\n"
-            report += f"• آزمایش‌های غیرناشتا: {non_fasting_count} عدد\n\n"
-
-            # Add individual tests
-            report += "📋 لیست آزمایش‌ها:\n"
-            report += "─"*30 + "\n"
-
-            for i, test in enumerate(tests[:10], 1):  # Limit to 10 tests
-                status_emoji = "🟢" if test['glucose'] <= 140 else "🟡" if test['glucose'] <= 200 else "🔴"
-                fasting_emoji = "🟦" if test['fasting'] else "🟧"
-
-                report += f"{i}. {status_emoji} {test['shamsi_date']} - ساعت {test['test_time']}\n"
-                report += f"   مقدار: {test['glucose']} mg/dL | نوع: {fasting_emoji} "
-                report += "ناشتا" if test['fasting'] else "غیرناشتا"
-                report += f"\n   علائم: {test['symptoms']}\n"
-
-                if test.get('notes'):
-                    report += f"   📝 یادداشت: {test['notes']}\n"
-
-                report += "\n"
-
-            if len(tests) > 10:
-                report += f"... و {len(tests) - 10} آزمایش دیگر\n\n"
-
-            report += "📅 تاریخ گزارش: " + jdatetime.datetime.now().strftime("%Y/%m/%d %H:%M")
-            report += "\n" + "="*40 + "\n"
-
-            return report
+            blocks = list(ReportGenerator._text_report_blocks(
+                tests, report_type, profile, max_tests))
+            if stamped:
+                blocks.append(ReportGenerator.text_report_stamp())
         except Exception as e:
             print(f"Error creating text report: {e}")
-            return f"❌ خطا در ایجاد گزارش: {str(e)}"
+            yield f"❌ خطا در ایجاد گزارش: {str(e)}"
+            return
+
+        chunk: List[str] = []
+        length = 0
+        for block in blocks:
+            block_length = _utf16_length(block)
+            if chunk and length + block_length > max_length:
+                yield "".join(chunk)
+                chunk, length = [], 0
+            chunk.append(block)
+            length += block_length
+        if chunk:
+            yield "".join(chunk)
+
+    @staticmethod
+    def _text_report_blocks(tests: List[Dict], report_type: str, profile,
+                            max_tests: Optional[int]) -> Iterator[str]:
+        """The report's sections and one block per listed test"""
+        from stats import compute_stats
+        from classifier import DEFAULT_PROFILE, LEVEL_EMOJIS
+
+        profile = profile or DEFAULT_PROFILE
+        stats = compute_stats(tests)
+
+        yield "".join(("📊 ", "="*40, "\n",
+                       f"گزارش {report_type} آزمایش‌های قند خون\n",
+                       "="*40, "\n\n"))
+
+        yield "\n".join((
+            "📈 آمار کلی:",
+            "─"*30,
+            f"• تعداد کل آزمایش‌ها: {stats.count} عدد",
+            f"• میانگین قند خون: {stats.mean:.1f} mg/dL",
+            f"• حداقل مقدار: {stats.min} mg/dL",
+            f"• حداکثر مقدار: {stats.max} mg/dL",
+            f"• انحراف معیار: {stats.std:.1f} mg/dL (CV: {stats.cv:.1f}%)",
+            f"• HbA1c تخمینی (GMI): {stats.gmi:.1f}%",
+            f"• آزمایش‌های ناشتا: {stats.fasting_count} عدد",
+            f"• آزمایش‌های غیرناشتا: {stats.non_fasting_count} عدد",
+        )) + "\n\n"
+
+        yield "".join(["🎯 توزیع مقادیر (mg/dL):\n"]
+                      + [f"• {label}: {share:.0f}%\n" for label, share in stats.range_shares()]
+                      + ["\n"])
+
+        yield "📋 لیست آزمایش‌ها:\n" + "─"*30 + "\n"
+
+        shown = tests if max_tests is None else tests[:max_tests]
+        levels = profile.classify_tests(shown).tolist()
+        for i, (test, level) in enumerate(zip(shown, levels), 1):
+            fasting_emoji = "🟦" if test['fasting'] else "🟧"
+            symptoms = test['symptoms'] or ''
+            if len(symptoms) > TEXT_SYMPTOMS_LENGTH:
+                symptoms = symptoms[:TEXT_SYMPTOMS_LENGTH] + "…"
+            lines = [
+                f"{i}. {LEVEL_EMOJIS[level]} {test['shamsi_date']} - ساعت {test['test_time']}",
+                f"   مقدار: {test['glucose']} mg/dL | نوع: {fasting_emoji} "
+                + ("ناشتا" if test['fasting'] else "غیرناشتا"),
+                f"   علائم: {escape_markdown(symptoms)}",
+            ]
+            if test.get('notes'):
+                notes = test['notes']
+                if len(notes) > TEXT_NOTES_LENGTH:
+                    notes = notes[:TEXT_NOTES_LENGTH] + "…"
+                lines.append(f"   📝 یادداشت: {escape_markdown(notes)}")
+            yield "\n".join(lines) + "\n\n"
+
+        if len(shown) < len(tests):
+            yield f"... و {len(tests) - len(shown)} آزمایش دیگر\n\n"
+
+    @staticmethod
+    def text_report_stamp() -> str:
+        """The text report's closing block, dated now"""
+        import jdatetime
+
+        return ("📅 تاریخ گزارش: " + jdatetime.datetime.now().strftime("%Y/%m/%d %H:%M")
+                + "\n" + "="*40 + "\n")
+
+    @staticmethod
+    def stamp_text_report(chunks: List[str], max_length: int = TEXT_CHUNK_LENGTH) -> List[str]:
+        """Add the stamp to chunks made with stamped=False"""
+        stamp = ReportGenerator.text_report_stamp()
+        if _utf16_length(chunks[-1] + stamp) <= max_length:
+            return chunks[:-1] + [chunks[-1] + stamp]
+        return chunks + [stamp]
+
+
+def _utf16_length(text: str) -> int:
+    # Telegram measures message length in UTF-16 code units, and emojis
+    # such as the status markers take two
+    return len(text.encode('utf-16-le')) // 2
+
+
+def escape_markdown(text: str) -> str:
+    """Escape user-entered text for Telegram's (legacy) Markdown"""
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', str(text))
+
+
+def _created_at_minutes(created_at: str) -> str:
+    # "2024-03-20T08:15:42.123+00:00" -> "2024-03-20 08:15", without
+    # parsing: the stored timestamp is always ISO 8601
+    return f"{created_at[:10]} {created_at[11:16]}"
+
+
+PDF_PAGE_SIZE = (8.27, 11.69)  # A4 in inches
+PDF_ROWS_PER_PAGE = 45
+PDF_LINE_SPACING = 1.55
+# Fonts tried in order for PDF reports; the first one installed is used
+PDF_FONT_FAMILIES = ['Vazirmatn', 'Tahoma', 'Arial', 'DejaVu Sans']
+
+
+@lru_cache(maxsize=1)
+def _pdf_fonts() -> Dict:
+    """Resolve the PDF font once per process"""
+    from matplotlib import font_manager
+
+    installed = {f.name for f in font_manager.fontManager.ttflist}
+    family = next((name for name in PDF_FONT_FAMILIES if name in installed),
+                  'DejaVu Sans')
+    path = font_manager.findfont(font_manager.FontProperties(family=family))
+
+    def font(size, weight='normal'):
+        return font_manager.FontProperties(fname=path, size=size, weight=weight)
+
+    return {
+        'title': font(20, 'bold'),
+        'header': font(12, 'bold'),
+        'body': font(13),
+        'row': font(10),
+        'footer': font(8),
+    }
+
+
+def _pdf_rule(y: float):
+    from matplotlib.lines import Line2D
+    return Line2D([0.06, 0.94], [y, y], color='black', linewidth=1.2)
+
+
+def _pdf_footer(fig, page: int, page_count: int, fonts: Dict):
+    return fig.text(0.5, 0.03, f"صفحه {page} از {page_count}", ha='center',
+                    alpha=0.7, fontproperties=fonts['footer'])
 
 
 # Create global report generator instance
@@ -0,0 +1,195 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Callable, Tuple
+
+
+@dataclass
+class RunningStats:
+    """Running aggregates for one user's glucose tests.
+
+    Mean and variance are kept with Welford's algorithm so that a single
+    test can be added or removed without revisiting the others.
+    """
+    count: int = 0
+    total: float = 0
+    mean: float = 0
+    m2: float = 0
+    min_glucose: Optional[int] = None
+    max_glucose: Optional[int] = None
+    fasting_count: int = 0
+    last_test: Optional[Dict] = None
+    # Set when a removal makes min/max/last_test unknowable locally
+    stale: bool = False
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_aggregates(cls, summary: Dict[str, Any]) -> "RunningStats":
+        count = summary['total_tests'] or 0
+        if not count:
+            return cls()
+        mean = summary['avg_glucose']
+        return cls(
+            count=count,
+            total=mean * count,
+            mean=mean,
+            m2=(summary.get('var_glucose') or 0) * count,
+            min_glucose=summary['min_glucose'],
+            max_glucose=summary['max_glucose'],
+            fasting_count=summary.get('fasting_count') or 0,
+            last_test=summary['last_test']
+        )
+
+    def add(self, test: Dict) -> None:
+        glucose = test['glucose']
+        self.count += 1
+        self.total += glucose
+        delta = glucose - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (glucose - self.mean)
+        if self.min_glucose is None or glucose < self.min_glucose:
+            self.min_glucose = glucose
+        if self.max_glucose is None or glucose > self.max_glucose:
+            self.max_glucose = glucose
+        if test['fasting']:
+            self.fasting_count += 1
+        self.last_test = test
+
+    def remove(self, test: Dict) -> None:
+        glucose = test['glucose']
+        if self.count <= 1:
+            self.__init__()
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.total -= glucose
+        self.mean = (old_mean * (self.count + 1) - glucose) / self.count
+        self.m2 = max(self.m2 - (glucose - old_mean) * (glucose - self.mean), 0)
+        if test['fasting']:
+            self.fasting_count -= 1
+        if glucose in (self.min_glucose, self.max_glucose):
+            self.stale = True
+        if self.last_test and self.last_test.get('id') == test.get('id'):
+            self.stale = True
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0
+
+    def as_user_stats(self) -> Dict[str, Any]:
+        """Return the dict shape of Database.get_user_stats"""
+        if not self.count:
+            return {
+                "total_tests": 0,
+                "avg_glucose": 0,
+                "last_test": None,
+                "min_glucose": 0,
+                "max_glucose": 0
+            }
+        return {
+            "total_tests": self.count,
+            "avg_glucose": self.mean,
+            "min_glucose": self.min_glucose,
+            "max_glucose": self.max_glucose,
+            "last_test": self.last_test,
+            "std_glucose": math.sqrt(self.variance),
+            "fasting_count": self.fasting_count,
+            "non_fasting_count": self.count - self.fasting_count
+        }
+
+
+class RollingStatsStore:
+    """Per-user RunningStats kept in process and updated on every write.
+
+    An entry is seeded from the server-side aggregates on first use and
+    reseeded once it is older than reconcile_after seconds, or when a
+    deletion leaves it stale, so drift from other replicas is bounded.
+    """
+
+    def __init__(self, loader: Callable[[int], Optional[Dict[str, Any]]],
+                 max_users: int = 10000, reconcile_after: float = 3600):
+        self.loader = loader
+        self.max_users = max_users
+        self.reconcile_after = reconcile_after
+        self._users: "OrderedDict[int, RunningStats]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Per-user counters bumped by every write to that user, so a seed
+        # loaded concurrently with a write is not stored (the write may or
+        # may not be in its aggregates); other users' seeds are unaffected.
+        # _generation covers counters dropped to keep _epochs bounded.
+        self._epochs: Dict[int, int] = {}
+        self._generation = 0
+
+    def _epoch(self, user_id: int) -> Tuple[int, int]:
+        return self._generation, self._epochs.get(user_id, 0)
+
+    def _bump(self, user_id: int) -> None:
+        if len(self._epochs) >= self.max_users * 4 and user_id not in self._epochs:
+            self._epochs.clear()
+            self._generation += 1
+        self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+
+    def _fresh(self, user_id: int) -> Optional[RunningStats]:
+        stats = self._users.get(user_id)
+        if stats is None or stats.stale:
+            return None
+        if time.monotonic() - stats.loaded_at > self.reconcile_after:
+            return None
+        self._users.move_to_end(user_id)
+        return stats
+
+    def get(self, user_id: int) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._fresh(user_id)
+            if stats is not None:
+                return stats.as_user_stats()
+            epoch = self._epoch(user_id)
+
+        summary = self.loader(user_id)
+        if summary is None:
+            # Aggregates could not be loaded; keep the caller's view empty
+            # without poisoning the store.
+            return RunningStats().as_user_stats()
+
+        stats = RunningStats.from_aggregates(summary)
+        with self._lock:
+            if epoch != self._epoch(user_id):
+                return stats.as_user_stats()
+            self._users[user_id] = stats
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return stats.as_user_stats()
+
+    def holds(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def record_add(self, user_id: int, test: Dict) -> None:
+        with self._lock:
+            self._bump(user_id)
+            stats = self._users.get(user_id)
+            if stats is not None:
+                stats.add(test)
+
+    def record_delete(self, user_id: int, test: Dict) -> None:
+        with self._lock:
+            self._bump(user_id)
+            stats = self._users.get(user_id)
+            if stats is not None:
+                stats.remove(test)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._bump(user_id)
+            self._users.pop(user_id, None)
+
+
+def create_rolling_stats_store(loader: Callable[[int], Optional[Dict[str, Any]]]) -> RollingStatsStore:
+    return RollingStatsStore(
+        loader,
+        max_users=int(os.environ.get("STATS_MAX_USERS", "10000")),
+        reconcile_after=float(os.environ.get("STATS_RECONCILE_SECONDS", "3600")))
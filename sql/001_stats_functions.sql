@@ -0,0 +1,32 @@
+-- Server-side aggregation for Database.get_user_stats.
+-- Run once in the Supabase SQL editor.
+
+create index if not exists glucose_tests_user_created_idx
+    on glucose_tests (user_id, created_at desc);
+
+create or replace function glucose_user_stats(p_user_id bigint)
+returns table (
+    total_tests bigint,
+    avg_glucose double precision,
+    min_glucose integer,
+    max_glucose integer,
+    last_test jsonb
+)
+language sql
+stable
+as $$
+    select
+        count(*),
+        coalesce(avg(t.glucose), 0)::double precision,
+        coalesce(min(t.glucose), 0),
+        coalesce(max(t.glucose), 0),
+        (
+            select to_jsonb(l)
+            from glucose_tests l
+            where l.user_id = p_user_id
+            order by l.created_at desc, l.id desc
+            limit 1
+        )
+    from glucose_tests t
+    where t.user_id = p_user_id;
+$$;
@@ -0,0 +1,36 @@
+-- Extend glucose_user_stats with the fasting count and population
+-- variance used to seed the running statistics in rolling_stats.py.
+-- Run once in the Supabase SQL editor after 001_stats_functions.sql.
+
+drop function if exists glucose_user_stats(bigint);
+
+create function glucose_user_stats(p_user_id bigint)
+returns table (
+    total_tests bigint,
+    avg_glucose double precision,
+    min_glucose integer,
+    max_glucose integer,
+    fasting_count bigint,
+    var_glucose double precision,
+    last_test jsonb
+)
+language sql
+stable
+as $$
+    select
+        count(*),
+        coalesce(avg(t.glucose), 0)::double precision,
+        coalesce(min(t.glucose), 0),
+        coalesce(max(t.glucose), 0),
+        count(*) filter (where t.fasting),
+        coalesce(var_pop(t.glucose), 0)::double precision,
+        (
+            select to_jsonb(l)
+            from glucose_tests l
+            where l.user_id = p_user_id
+            order by l.created_at desc, l.id desc
+            limit 1
+        )
+    from glucose_tests t
+    where t.user_id = p_user_id;
+$$;
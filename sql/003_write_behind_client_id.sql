@@ -0,0 +1,9 @@
+-- Idempotency key for batched inserts from write-behind mode
+-- (WRITE_BEHIND=1). Replayed batches are upserted on client_id.
+-- Run once in the Supabase SQL editor.
+
+alter table glucose_tests
+    add column if not exists client_id uuid;
+
+create unique index if not exists glucose_tests_client_id_key
+    on glucose_tests (client_id);
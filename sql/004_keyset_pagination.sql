@@ -0,0 +1,45 @@
+-- Keyset pagination for Database.get_user_tests_page.
+-- Run once in the Supabase SQL editor.
+
+-- Covers the (created_at, id) sort key, so each page is one index range
+-- scan however far back it starts. Replaces the index from 001.
+create index if not exists glucose_tests_user_created_id_idx
+    on glucose_tests (user_id, created_at desc, id desc);
+
+drop index if exists glucose_tests_user_created_idx;
+
+-- Rows strictly older (or with p_newer, newer) than the cursor. Older
+-- rows come newest first, newer rows oldest first so that the limit
+-- keeps the ones closest to the cursor.
+create or replace function glucose_tests_page(
+    p_user_id bigint,
+    p_limit integer,
+    p_cursor_created_at timestamptz default null,
+    p_cursor_id bigint default null,
+    p_newer boolean default false
+)
+returns setof glucose_tests
+language sql
+stable
+as $$
+    (
+        select *
+        from glucose_tests t
+        where not p_newer
+          and t.user_id = p_user_id
+          and (p_cursor_id is null
+               or (t.created_at, t.id) < (p_cursor_created_at, p_cursor_id))
+        order by t.created_at desc, t.id desc
+        limit p_limit
+    )
+    union all
+    (
+        select *
+        from glucose_tests t
+        where p_newer
+          and t.user_id = p_user_id
+          and (t.created_at, t.id) > (p_cursor_created_at, p_cursor_id)
+        order by t.created_at, t.id
+        limit p_limit
+    );
+$$;
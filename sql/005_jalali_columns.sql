@@ -0,0 +1,30 @@
+-- Integer Jalali date columns for Database.get_monthly_tests, which now
+-- matches jalali_year/jalali_month instead of a created_at range.
+-- Run in the Supabase SQL editor BEFORE deploying the bot version that
+-- writes these columns, then run the backfill below AGAIN once the new
+-- version is live: rows the old bot inserts in between get NULL jalali_*
+-- and would be missing from monthly reports.
+
+alter table glucose_tests
+    add column if not exists jalali_year smallint,
+    add column if not exists jalali_month smallint,
+    add column if not exists jalali_day smallint;
+
+-- Backfill from shamsi_date ("YYYY/MM/DD"), the Jalali day each test was
+-- recorded on. Batched so no single statement holds locks for long;
+-- rerun until it reports UPDATE 0, both before and after the deploy.
+update glucose_tests
+set jalali_year = split_part(shamsi_date, '/', 1)::smallint,
+    jalali_month = split_part(shamsi_date, '/', 2)::smallint,
+    jalali_day = split_part(shamsi_date, '/', 3)::smallint
+where id in (
+    select id
+    from glucose_tests
+    where jalali_year is null
+      and shamsi_date is not null
+    limit 50000
+);
+
+-- Trailing (created_at, id) returns the month already in display order
+create index if not exists glucose_tests_user_jalali_month_idx
+    on glucose_tests (user_id, jalali_year, jalali_month, created_at desc, id desc);
@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+
+from storage import (StorageBackend, PageCursor, BOT_TIMEZONE, empty_weekly_stats,
+                     weekly_stats_from_tests)
+
+COLUMNS = ("user_id", "glucose", "fasting", "test_time", "symptoms", "notes",
+           "shamsi_date", "jalali_year", "jalali_month", "jalali_day",
+           "created_at", "client_id")
+INSERT_SQL = (f"INSERT OR IGNORE INTO glucose_tests ({', '.join(COLUMNS)}) "
+              f"VALUES ({', '.join('?' * len(COLUMNS))})")
+
+
+class SQLiteDatabase(StorageBackend):
+    """Stores glucose tests in a local SQLite file.
+
+    Useful for local development and offline load tests, where round
+    trips to Supabase would dominate. Rows come back in the same shape as
+    the Supabase backend returns them. Each thread gets its own
+    connection; the file uses WAL so readers do not block the writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self.create_tables()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection for the calling thread, opened on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def create_tables(self):
+        """Create necessary tables if they don't exist"""
+        with self.connection as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS glucose_tests ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "user_id INTEGER NOT NULL, "
+                "glucose INTEGER NOT NULL, "
+                "fasting INTEGER NOT NULL, "
+                "test_time TEXT, "
+                "symptoms TEXT, "
+                "notes TEXT, "
+                "shamsi_date TEXT, "
+                "jalali_year INTEGER, "
+                "jalali_month INTEGER, "
+                "jalali_day INTEGER, "
+                "created_at TEXT NOT NULL, "
+                "client_id TEXT UNIQUE)")
+            self._add_jalali_columns(connection)
+            connection.execute("DROP INDEX IF EXISTS glucose_tests_user_created_idx")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS glucose_tests_user_created_id_idx "
+                "ON glucose_tests (user_id, created_at DESC, id DESC)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS glucose_tests_user_jalali_month_idx "
+                "ON glucose_tests (user_id, jalali_year, jalali_month, "
+                "created_at DESC, id DESC)")
+
+    @staticmethod
+    def _add_jalali_columns(connection: sqlite3.Connection) -> None:
+        # Files created before the jalali_* columns existed: add them and
+        # fill them from shamsi_date ("YYYY/MM/DD")
+        existing = {row[1] for row in connection.execute("PRAGMA table_info(glucose_tests)")}
+        if "jalali_year" in existing:
+            return
+        for column in ("jalali_year", "jalali_month", "jalali_day"):
+            connection.execute(f"ALTER TABLE glucose_tests ADD COLUMN {column} INTEGER")
+        connection.execute(
+            "UPDATE glucose_tests SET "
+            "jalali_year = CAST(substr(shamsi_date, 1, 4) AS INTEGER), "
+            "jalali_month = CAST(substr(shamsi_date, 6, 2) AS INTEGER), "
+            "jalali_day = CAST(substr(shamsi_date, 9, 2) AS INTEGER)")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        test = dict(row)
+        test["fasting"] = bool(test["fasting"])
+        return test
+
+    def _select(self, where: str, params: tuple, suffix: str = "") -> List[Dict]:
+        rows = self.connection.execute(
+            f"SELECT * FROM glucose_tests WHERE {where} {suffix}", params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def add_test(self, user_id: int, glucose: int, fasting: bool,
+                 test_time: str, symptoms: str, notes: Optional[str] = None) -> Optional[Dict]:
+        """Add a new glucose test record"""
+        try:
+            data = self.build_test_row(
+                user_id, glucose, fasting, test_time, symptoms, notes)
+            with self.connection as connection:
+                cursor = connection.execute(
+                    INSERT_SQL, tuple(data.get(column) for column in COLUMNS))
+            return {"id": cursor.lastrowid, **data}
+        except Exception as e:
+            print(f"Error adding test: {e}")
+            return None
+
+    def add_tests_bulk(self, rows: List[Dict]) -> Optional[List[Dict]]:
+        """Insert many prepared rows in one transaction
+
+        Rows whose client_id is already stored are skipped, matching the
+        Supabase backend's upsert, and only the inserted rows are
+        returned. Returns None if the insert failed.
+        """
+        try:
+            inserted = []
+            with self.connection as connection:
+                for row in rows:
+                    cursor = connection.execute(
+                        INSERT_SQL, tuple(row.get(column) for column in COLUMNS))
+                    if cursor.rowcount:
+                        inserted.append(row)
+            return inserted
+        except Exception as e:
+            print(f"Error adding tests in bulk: {e}")
+            return None
+
+    def get_user_tests(self, user_id: int, limit: int = 100) -> List[Dict]:
+        """Get all tests for a user"""
+        try:
+            return self._select("user_id = ?", (user_id, limit),
+                                "ORDER BY created_at DESC, id DESC LIMIT ?")
+        except Exception as e:
+            print(f"Error getting user tests: {e}")
+            return []
+
+    def get_user_tests_page(self, user_id: int, limit: int,
+                            cursor: Optional[PageCursor] = None,
+                            newer: bool = False) -> List[Dict]:
+        """Get one page of a user's tests, newest first"""
+        try:
+            if cursor is None:
+                return self._select("user_id = ?", (user_id, limit),
+                                    "ORDER BY created_at DESC, id DESC LIMIT ?")
+            if newer:
+                tests = self._select("user_id = ? AND (created_at, id) > (?, ?)",
+                                     (user_id, *cursor, limit),
+                                     "ORDER BY created_at, id LIMIT ?")
+                return tests[::-1]
+            return self._select("user_id = ? AND (created_at, id) < (?, ?)",
+                                (user_id, *cursor, limit),
+                                "ORDER BY created_at DESC, id DESC LIMIT ?")
+        except Exception as e:
+            print(f"Error getting user tests page: {e}")
+            return []
+
+    def get_weekly_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get weekly statistics for a user"""
+        try:
+            week_ago = (datetime.now(BOT_TIMEZONE) - timedelta(days=7)).isoformat()
+
+            tests = self._select("user_id = ? AND created_at >= ?", (user_id, week_ago),
+                                 "ORDER BY created_at DESC, id DESC")
+
+            return weekly_stats_from_tests(tests)
+        except Exception as e:
+            print(f"Error getting weekly stats: {e}")
+            return empty_weekly_stats()
+
+    def get_monthly_tests(self, user_id: int, year: int, month: int) -> List[Dict]:
+        """Get tests for a specific Jalali month"""
+        try:
+            return self._select(
+                "user_id = ? AND jalali_year = ? AND jalali_month = ?",
+                (user_id, year, month), "ORDER BY created_at DESC, id DESC")
+        except Exception as e:
+            print(f"Error getting monthly tests: {e}")
+            return []
+
+    def delete_test(self, test_id: int, user_id: Optional[int] = None) -> bool:
+        """Delete a test by ID, only if it is user_id's when that is given"""
+        try:
+            with self.connection as connection:
+                if user_id is None:
+                    connection.execute("DELETE FROM glucose_tests WHERE id = ?", (test_id,))
+                else:
+                    connection.execute("DELETE FROM glucose_tests WHERE id = ? AND user_id = ?",
+                                       (test_id, user_id))
+            return True
+        except Exception as e:
+            print(f"Error deleting test: {e}")
+            return False
+
+    def get_test_by_id(self, test_id: int) -> Optional[Dict]:
+        """Get a test by ID"""
+        try:
+            tests = self._select("id = ?", (test_id,))
+            return tests[0] if tests else None
+        except Exception as e:
+            print(f"Error getting test by ID: {e}")
+            return None
+
+    def get_user_aggregates(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get summary aggregates for a user in a single scan"""
+        try:
+            row = self.connection.execute(
+                "SELECT count(*) AS total_tests, avg(glucose) AS avg_glucose, "
+                "min(glucose) AS min_glucose, max(glucose) AS max_glucose, "
+                "coalesce(sum(fasting), 0) AS fasting_count, "
+                "avg(glucose * glucose) - avg(glucose) * avg(glucose) AS var_glucose "
+                "FROM glucose_tests WHERE user_id = ?", (user_id,)).fetchone()
+            summary = dict(row)
+            if not summary["total_tests"]:
+                return {"total_tests": 0}
+            last = self._select("user_id = ?", (user_id,),
+                                "ORDER BY created_at DESC, id DESC LIMIT 1")
+            summary["var_glucose"] = max(summary["var_glucose"] or 0, 0)
+            summary["last_test"] = last[0] if last else None
+            return summary
+        except Exception as e:
+            print(f"Error getting user aggregates: {e}")
+            return None
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Range boundaries in mg/dL, the same lines create_monthly_chart draws
+RANGE_THRESHOLDS = (70, 100, 140, 200)
+# (key, label) per bucket: below 70, 70-100, 101-140, 141-200, above 200
+RANGE_BUCKETS = (
+    ("low", "کمتر از ۷۰"),
+    ("normal_fasting", "۷۰ تا ۱۰۰"),
+    ("normal", "۱۰۱ تا ۱۴۰"),
+    ("high", "۱۴۱ تا ۲۰۰"),
+    ("very_high", "بیشتر از ۲۰۰"),
+)
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+@dataclass
+class GlucoseStats:
+    count: int
+    mean: float
+    min: int
+    max: int
+    # Population standard deviation, as in rolling_stats.RunningStats
+    std: float
+    # Coefficient of variation in percent
+    cv: float
+    # Glucose Management Indicator: estimated HbA1c in percent
+    gmi: float
+    percentiles: Dict[int, float]
+    fasting_count: int
+    non_fasting_count: int
+    # Number of readings per RANGE_BUCKETS key
+    range_counts: Dict[str, int]
+
+    def range_shares(self) -> List[Tuple[str, float]]:
+        """(label, percent of readings) for every bucket"""
+        return [(label, 100 * self.range_counts[key] / self.count)
+                for key, label in RANGE_BUCKETS]
+
+
+def compute_stats(tests: Sequence[Dict]) -> Optional[GlucoseStats]:
+    """Summarize tests in one vectorized pass; None if there are none"""
+    count = len(tests)
+    if not count:
+        return None
+
+    # map(itemgetter) keeps the per-row extraction in C
+    glucose = np.fromiter(map(itemgetter('glucose'), tests), dtype=np.float64, count=count)
+    fasting = np.fromiter(map(itemgetter('fasting'), tests), dtype=bool, count=count)
+
+    mean = float(glucose.mean())
+    std = float(glucose.std())
+    fasting_count = int(np.count_nonzero(fasting))
+
+    # Bucket i holds readings up to and including RANGE_THRESHOLDS[i],
+    # except the lowest bucket which stops below 70
+    buckets = np.searchsorted(RANGE_THRESHOLDS[1:], glucose, side='left') + 1
+    buckets[glucose < RANGE_THRESHOLDS[0]] = 0
+    bucket_counts = np.bincount(buckets, minlength=len(RANGE_BUCKETS))
+
+    return GlucoseStats(
+        count=count,
+        mean=mean,
+        min=int(glucose.min()),
+        max=int(glucose.max()),
+        std=std,
+        cv=100 * std / mean if mean else 0.0,
+        gmi=3.31 + 0.02392 * mean,
+        percentiles=dict(zip(PERCENTILES, np.percentile(glucose, PERCENTILES).tolist())),
+        fasting_count=fasting_count,
+        non_fasting_count=count - fasting_count,
+        range_counts={key: int(n) for (key, _), n in zip(RANGE_BUCKETS, bucket_counts)},
+    )
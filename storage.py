@@ -0,0 +1,169 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from zoneinfo import ZoneInfo
+
+from jalali import jalali_day, format_jalali_day
+
+# Users' local time zone: new tests are stamped, and filed under a Jalali
+# day, in it rather than in the server's zone
+BOT_TIMEZONE = ZoneInfo(os.environ.get("BOT_TIMEZONE", "Asia/Tehran"))
+
+# Accepted glucose readings in mg/dL, inclusive
+GLUCOSE_MIN = 1
+GLUCOSE_MAX = 1000
+
+# Position in a user's test list: (created_at, id) of the last row shown
+PageCursor = Tuple[str, int]
+
+
+class StorageBackend(ABC):
+    """Interface every glucose test store implements.
+
+    Database (Supabase) is the production backend; SQLiteDatabase in
+    sqlite_db.py stores everything in a local file. create_database()
+    picks one from DB_BACKEND.
+    """
+
+    @staticmethod
+    def build_test_row(user_id: int, glucose: int, fasting: bool,
+                       test_time: str, symptoms: str, notes: Optional[str] = None,
+                       created_at: Optional[datetime] = None) -> Dict:
+        """Build a glucose_tests row stamped with created_at (default now)"""
+        # Get current Jalali date
+        now = created_at or datetime.now(BOT_TIMEZONE)
+        day = now.date().isoformat()
+        jalali_date = jalali_day(day)
+
+        return {
+            "user_id": user_id,
+            "glucose": glucose,
+            "fasting": fasting,
+            "test_time": test_time,
+            "symptoms": symptoms,
+            "notes": notes,
+            "shamsi_date": format_jalali_day(day),
+            "jalali_year": jalali_date.year,
+            "jalali_month": jalali_date.month,
+            "jalali_day": jalali_date.day,
+            "created_at": now.isoformat()
+        }
+
+    def warm_up(self) -> Optional[threading.Thread]:
+        """Prepare connections ahead of the first query (optional)"""
+        return None
+
+    @abstractmethod
+    def add_test(self, user_id: int, glucose: int, fasting: bool,
+                 test_time: str, symptoms: str, notes: Optional[str] = None) -> Optional[Dict]:
+        """Add a new glucose test record"""
+
+    @abstractmethod
+    def add_tests_bulk(self, rows: List[Dict]) -> Optional[List[Dict]]:
+        """Insert many prepared rows; None if the insert failed"""
+
+    @abstractmethod
+    def get_user_tests(self, user_id: int, limit: int = 100) -> List[Dict]:
+        """Get all tests for a user"""
+
+    @abstractmethod
+    def get_user_tests_page(self, user_id: int, limit: int,
+                            cursor: Optional[PageCursor] = None,
+                            newer: bool = False) -> List[Dict]:
+        """Get one page of a user's tests, newest first
+
+        Returns up to limit tests older than cursor (the first page if
+        cursor is None), or with newer=True the tests just newer than it.
+        """
+
+    @abstractmethod
+    def get_weekly_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get weekly statistics for a user"""
+
+    @abstractmethod
+    def get_monthly_tests(self, user_id: int, year: int, month: int) -> List[Dict]:
+        """Get tests for a specific Jalali month"""
+
+    @abstractmethod
+    def delete_test(self, test_id: int, user_id: Optional[int] = None) -> bool:
+        """Delete a test by ID, only if it is user_id's when that is given"""
+
+    @abstractmethod
+    def get_test_by_id(self, test_id: int) -> Optional[Dict]:
+        """Get a test by ID"""
+
+    @abstractmethod
+    def get_user_aggregates(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get summary aggregates for a user
+
+        Returns total_tests, avg_glucose, min_glucose, max_glucose,
+        fasting_count, var_glucose (population variance) and last_test,
+        or None if the query failed.
+        """
+
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get overall statistics for a user
+
+        Built from get_user_aggregates, so only the summary numbers and
+        the latest test are fetched.
+        """
+        summary = self.get_user_aggregates(user_id)
+
+        if not summary or not summary['total_tests']:
+            return empty_user_stats()
+
+        return {
+            "total_tests": summary['total_tests'],
+            "avg_glucose": summary['avg_glucose'],
+            "min_glucose": summary['min_glucose'],
+            "max_glucose": summary['max_glucose'],
+            "last_test": summary['last_test']
+        }
+
+
+def is_valid_glucose(glucose: int) -> bool:
+    return GLUCOSE_MIN <= glucose <= GLUCOSE_MAX
+
+
+def jalali_columns(shamsi_date: str) -> Dict[str, int]:
+    """jalali_year/month/day for a "YYYY/MM/DD" shamsi_date"""
+    year, month, day = (int(part) for part in shamsi_date.split("/"))
+    return {"jalali_year": year, "jalali_month": month, "jalali_day": day}
+
+
+def empty_weekly_stats() -> Dict[str, Any]:
+    return {
+        "count": 0,
+        "avg_glucose": 0,
+        "fasting_count": 0,
+        "non_fasting_count": 0,
+        "tests": []
+    }
+
+
+def weekly_stats_from_tests(tests: List[Dict]) -> Dict[str, Any]:
+    """get_weekly_stats result for already fetched tests"""
+    from stats import compute_stats
+
+    stats = compute_stats(tests)
+    if stats is None:
+        return empty_weekly_stats()
+    return {
+        "count": stats.count,
+        "avg_glucose": stats.mean,
+        "fasting_count": stats.fasting_count,
+        "non_fasting_count": stats.non_fasting_count,
+        "tests": tests
+    }
+
+
+def empty_user_stats() -> Dict[str, Any]:
+    return {
+        "total_tests": 0,
+        "avg_glucose": 0,
+        "last_test": None,
+        "min_glucose": 0,
+        "max_glucose": 0
+    }
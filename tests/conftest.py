@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# db.py opens the configured backend on import; never the real Supabase
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "global.db")
+
+from sqlite_db import SQLiteDatabase  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    return SQLiteDatabase(str(tmp_path / "tests.db"))
+
+
+def make_row(user_id=1, glucose=100, fasting=False, created_at=None,
+             client_id=None, symptoms="هیچکدام", notes=None):
+    """A prepared glucose_tests row, as add_tests_bulk takes them"""
+    row = SQLiteDatabase.build_test_row(
+        user_id, glucose, fasting, "08:00", symptoms, notes,
+        created_at=created_at or datetime(2024, 3, 20, 8, 0))
+    if client_id is not None:
+        row["client_id"] = client_id
+    return row
+
+
+def rows_at(times, user_id=1):
+    """One row per datetime in times, glucose 100, 101, ..."""
+    return [make_row(user_id, 100 + i, created_at=moment) for i, moment in enumerate(times)]
+
+
+def minutes(start, count):
+    return [start + timedelta(minutes=i) for i in range(count)]
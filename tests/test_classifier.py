@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from classifier import (DEFAULT_PROFILE, PROFILES, LOW, NORMAL, ELEVATED, HIGH,
+                        profile_for, status_line)
+
+GLUCOSE_RANGE = range(1, 1001)
+
+
+def old_fasting_level(glucose):
+    # The bot's original fasting status thresholds
+    if glucose < 70:
+        return LOW
+    elif glucose <= 100:
+        return NORMAL
+    elif glucose <= 125:
+        return ELEVATED
+    return HIGH
+
+
+def old_non_fasting_level(glucose):
+    if glucose < 70:
+        return LOW
+    elif glucose <= 140:
+        return NORMAL
+    elif glucose <= 200:
+        return ELEVATED
+    return HIGH
+
+
+@pytest.mark.parametrize("fasting, old_level", [
+    (True, old_fasting_level), (False, old_non_fasting_level)])
+def test_standard_profile_matches_old_thresholds(fasting, old_level):
+    for glucose in GLUCOSE_RANGE:
+        assert DEFAULT_PROFILE.classify(glucose, fasting) == old_level(glucose), glucose
+
+
+@pytest.mark.parametrize("profile", list(PROFILES.values()), ids=list(PROFILES))
+def test_vectorized_matches_single_reading(profile):
+    glucose = np.array(list(GLUCOSE_RANGE) * 2, dtype=np.float64)
+    fasting = np.repeat([True, False], len(GLUCOSE_RANGE))
+
+    levels = profile.classify_many(glucose, fasting)
+
+    expected = [profile.classify(g, f) for g, f in zip(glucose, fasting)]
+    assert levels.tolist() == expected
+
+
+def test_classify_tests_reads_rows():
+    tests = [{"glucose": 65, "fasting": True}, {"glucose": 110, "fasting": True},
+             {"glucose": 110, "fasting": False}, {"glucose": 260, "fasting": False}]
+
+    assert DEFAULT_PROFILE.classify_tests(tests).tolist() == [LOW, ELEVATED, NORMAL, HIGH]
+
+
+def test_profile_for_falls_back_to_standard():
+    assert profile_for(None) is DEFAULT_PROFILE
+    assert profile_for({"target_profile": "unknown"}) is DEFAULT_PROFILE
+    assert profile_for({"target_profile": "pregnancy"}) is PROFILES["pregnancy"]
+
+
+def test_status_line_matches_old_wording():
+    assert status_line(DEFAULT_PROFILE, 90, True) == "✅ **عالی:** در محدوده نرمال ناشتا"
+    assert status_line(DEFAULT_PROFILE, 210, False) == "🔴 **خطر:** بسیار بالا"
@@ -0,0 +1,88 @@
+import asyncio
+import csv
+
+import pytest
+
+from db import AsyncDatabase
+from importer import (import_file, parse_row, map_columns, InvalidImportFile,
+                      SYMPTOMS_MAX_LENGTH, NOTES_MAX_LENGTH)
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        csv.writer(file).writerows(rows)
+    return str(path)
+
+
+def run_import(database, path, filename="readings.csv"):
+    async_database = AsyncDatabase(database, max_workers=1)
+    try:
+        return asyncio.run(import_file(async_database, 1, path, filename))
+    finally:
+        async_database.shutdown()
+
+
+def test_parse_row_reads_persian_headers_and_digits():
+    columns = map_columns(["تاریخ", "ساعت", "قند خون", "ناشتا", "یادداشت"])
+
+    row = parse_row(7, ["2024-03-20", "۰۸:۳۰", "۱۲۰", "بله", "بعد از ورزش"], columns)
+
+    assert row["user_id"] == 7
+    assert row["glucose"] == 120
+    assert row["fasting"] is True
+    assert row["created_at"] == "2024-03-20T08:30:00"
+    assert row["notes"] == "بعد از ورزش"
+
+
+def test_parse_row_rejects_out_of_range_glucose():
+    columns = map_columns(["date", "glucose"])
+
+    with pytest.raises(ValueError):
+        parse_row(1, ["2024-03-20", "0"], columns)
+
+
+def test_parse_row_caps_free_text():
+    columns = map_columns(["date", "glucose", "symptoms", "notes"])
+
+    row = parse_row(1, ["2024-03-20", "100", "x" * 1000, "y" * 1000], columns)
+
+    assert len(row["symptoms"]) == SYMPTOMS_MAX_LENGTH
+    assert len(row["notes"]) == NOTES_MAX_LENGTH
+
+
+def test_import_keeps_equal_readings_on_one_day(database, tmp_path):
+    path = write_csv(tmp_path / "readings.csv", [
+        ["date", "glucose"],
+        ["2024-03-20", "120"],
+        ["2024-03-20", "120"],
+        ["2024-03-21", "99"],
+        ["not a date", "99"],
+    ])
+
+    summary = run_import(database, path)
+
+    assert (summary.imported, summary.duplicates, summary.skipped) == (3, 0, 1)
+    assert summary.skipped_lines == [5]
+    assert len(database.get_user_tests(1)) == 3
+
+
+def test_reimporting_a_file_adds_nothing(database, tmp_path):
+    path = write_csv(tmp_path / "readings.csv", [
+        ["date", "time", "glucose"],
+        ["2024-03-20", "08:00", "120"],
+        ["2024-03-20", "", "120"],
+        ["2024-03-20", "", "120"],
+    ])
+    run_import(database, path)
+
+    summary = run_import(database, path)
+
+    assert (summary.imported, summary.duplicates) == (0, 3)
+    assert len(database.get_user_tests(1)) == 3
+
+
+def test_import_rejects_a_file_without_glucose_column(database, tmp_path):
+    path = write_csv(tmp_path / "readings.csv", [["date", "weight"], ["2024-03-20", "70"]])
+
+    with pytest.raises(InvalidImportFile):
+        run_import(database, path)
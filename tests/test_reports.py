@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from reports import ReportGenerator, TEXT_CHUNK_LENGTH, _utf16_length
+from storage import StorageBackend
+
+
+def month_of_tests(count=120, symptoms="هیچکدام", notes=None):
+    start = datetime(2024, 3, 20, 8, 0)
+    tests = []
+    for i in range(count):
+        row = StorageBackend.build_test_row(
+            1, 70 + (i * 37) % 200, i % 3 == 0, "08:00", symptoms, notes,
+            created_at=start + timedelta(hours=6 * i))
+        tests.append({"id": i + 1, **row})
+    return tests
+
+
+def chunks_of(tests, **kwargs):
+    return list(ReportGenerator.create_text_report_chunks(tests, "ماهانه", **kwargs))
+
+
+def test_chunks_fit_telegram_limit_in_utf16_units():
+    chunks = chunks_of(month_of_tests(notes="یادداشت 🙂" * 30))
+
+    assert len(chunks) > 1
+    # Emojis count twice in UTF-16, so len() alone would under-count
+    assert all(_utf16_length(chunk) <= TEXT_CHUNK_LENGTH for chunk in chunks)
+    assert any(_utf16_length(chunk) > len(chunk) for chunk in chunks)
+
+
+def test_oversized_user_text_is_truncated_to_fit():
+    chunks = chunks_of(month_of_tests(10, symptoms="_" * 10000, notes="*" * 10000))
+
+    assert all(_utf16_length(chunk) <= TEXT_CHUNK_LENGTH for chunk in chunks)
+
+
+@pytest.mark.parametrize("max_length", [500, 1000, 2000])
+def test_chunks_respect_a_smaller_limit(max_length):
+    chunks = chunks_of(month_of_tests(), max_length=max_length)
+
+    assert all(_utf16_length(chunk) <= max_length for chunk in chunks)
+
+
+def test_chunks_join_to_the_single_report():
+    tests = month_of_tests(30)
+
+    joined = "".join(chunks_of(tests, stamped=False))
+    single = ReportGenerator.create_text_report(tests, "ماهانه")
+
+    assert single.startswith(joined)
+    assert single[len(joined):].startswith("📅")
+
+
+def test_user_text_is_escaped():
+    report = "".join(chunks_of(month_of_tests(1, symptoms="a_b*c")))
+
+    assert "a\\_b\\*c" in report
+
+
+def test_a_bad_row_gives_the_error_message():
+    tests = month_of_tests(5)
+    tests[2]["glucose"] = None
+
+    chunks = chunks_of(tests)
+
+    assert len(chunks) == 1 and chunks[0].startswith("❌")
@@ -0,0 +1,112 @@
+import statistics
+
+import pytest
+
+from rolling_stats import RunningStats, RollingStatsStore
+
+READINGS = [95, 180, 72, 140, 101, 250, 88]
+
+
+def make_tests(readings):
+    return [{"id": i, "glucose": glucose, "fasting": i % 2 == 0}
+            for i, glucose in enumerate(readings)]
+
+
+def test_add_matches_batch_statistics():
+    stats = RunningStats()
+    for test in make_tests(READINGS):
+        stats.add(test)
+
+    assert stats.count == len(READINGS)
+    assert stats.mean == pytest.approx(statistics.fmean(READINGS))
+    assert stats.variance == pytest.approx(statistics.pvariance(READINGS))
+    assert (stats.min_glucose, stats.max_glucose) == (72, 250)
+    assert stats.fasting_count == 4
+
+
+def test_remove_undoes_add():
+    tests = make_tests(READINGS)
+    stats = RunningStats()
+    for test in tests:
+        stats.add(test)
+
+    stats.remove(tests[1])
+    rest = READINGS[:1] + READINGS[2:]
+
+    assert stats.count == len(rest)
+    assert stats.mean == pytest.approx(statistics.fmean(rest))
+    assert stats.variance == pytest.approx(statistics.pvariance(rest))
+    assert stats.fasting_count == 4
+    assert not stats.stale
+
+
+def test_removing_an_extreme_marks_stats_stale():
+    tests = make_tests(READINGS)
+    stats = RunningStats()
+    for test in tests:
+        stats.add(test)
+
+    stats.remove(tests[5])
+
+    assert stats.stale
+
+
+def test_removing_the_last_test_resets():
+    stats = RunningStats()
+    test = make_tests([120])[0]
+    stats.add(test)
+    stats.remove(test)
+
+    assert stats.as_user_stats()["total_tests"] == 0
+
+
+def test_seed_from_aggregates_continues_incrementally():
+    seeded = RunningStats.from_aggregates({
+        "total_tests": 3, "avg_glucose": statistics.fmean(READINGS[:3]),
+        "var_glucose": statistics.pvariance(READINGS[:3]), "min_glucose": 72,
+        "max_glucose": 180, "fasting_count": 2, "last_test": None})
+
+    for test in make_tests(READINGS)[3:]:
+        seeded.add(test)
+
+    assert seeded.mean == pytest.approx(statistics.fmean(READINGS))
+    assert seeded.variance == pytest.approx(statistics.pvariance(READINGS))
+
+
+def test_store_updates_held_users_in_place(database):
+    store = RollingStatsStore(database.get_user_aggregates)
+    first = database.add_test(1, 100, True, "08:00", "هیچکدام")
+    assert store.get(1)["total_tests"] == 1
+
+    test = database.add_test(1, 140, False, "12:00", "هیچکدام")
+    store.record_add(1, test)
+
+    stats = store.get(1)
+    assert stats["total_tests"] == 2
+    assert stats["avg_glucose"] == pytest.approx(120)
+    assert stats["last_test"]["id"] == test["id"] != first["id"]
+
+
+def test_store_skips_a_seed_raced_by_a_write_to_the_same_user(database):
+    store = RollingStatsStore(database.get_user_aggregates)
+
+    def loader(user_id):
+        # Another write to this user lands while the seed is loading
+        store.record_add(user_id, {"glucose": 100, "fasting": False})
+        return database.get_user_aggregates(user_id)
+
+    store.loader = loader
+    store.get(1)
+    assert not store.holds(1)
+
+
+def test_store_keeps_a_seed_when_another_user_writes(database):
+    store = RollingStatsStore(database.get_user_aggregates)
+
+    def loader(user_id):
+        store.record_add(user_id + 1, {"glucose": 100, "fasting": False})
+        return database.get_user_aggregates(user_id)
+
+    store.loader = loader
+    store.get(1)
+    assert store.holds(1)
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from conftest import make_row, rows_at, minutes
+
+
+def page_keys(tests):
+    return [(test['created_at'], test['id']) for test in tests]
+
+
+def test_pages_walk_all_tests_newest_first(database):
+    # Three tests share each timestamp, so pages must break ties on id
+    times = [moment for moment in minutes(datetime(2024, 3, 20, 8, 0), 4) for _ in range(3)]
+    database.add_tests_bulk(rows_at(times))
+    everything = database.get_user_tests(1, limit=100)
+
+    pages = [database.get_user_tests_page(1, 5)]
+    while len(pages[-1]) == 5:
+        last = pages[-1][-1]
+        pages.append(database.get_user_tests_page(1, 5, (last['created_at'], last['id'])))
+
+    walked = [test for page in pages for test in page]
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert page_keys(walked) == page_keys(everything)
+    assert page_keys(walked) == sorted(page_keys(walked), reverse=True)
+
+
+def test_newer_page_returns_the_previous_page(database):
+    times = [moment for moment in minutes(datetime(2024, 3, 20, 8, 0), 3) for _ in range(4)]
+    database.add_tests_bulk(rows_at(times))
+
+    first = database.get_user_tests_page(1, 5)
+    second = database.get_user_tests_page(1, 5, (first[-1]['created_at'], first[-1]['id']))
+    back = database.get_user_tests_page(
+        1, 5, (second[0]['created_at'], second[0]['id']), newer=True)
+
+    assert page_keys(back) == page_keys(first)
+
+
+def test_pages_are_per_user(database):
+    database.add_tests_bulk(rows_at(minutes(datetime(2024, 3, 20), 3), user_id=1)
+                            + rows_at(minutes(datetime(2024, 3, 20), 2), user_id=2))
+
+    assert len(database.get_user_tests_page(1, 10)) == 3
+    assert {test['user_id'] for test in database.get_user_tests_page(2, 10)} == {2}
+
+
+def test_bulk_insert_skips_known_client_ids(database):
+    rows = [make_row(glucose=110, client_id="a"), make_row(glucose=120, client_id="b")]
+    assert len(database.add_tests_bulk(rows)) == 2
+
+    again = database.add_tests_bulk([make_row(glucose=110, client_id="a"),
+                                     make_row(glucose=130, client_id="c")])
+
+    assert [row['client_id'] for row in again] == ["c"]
+    assert sorted(test['glucose'] for test in database.get_user_tests(1)) == [110, 120, 130]
+
+
+def test_bulk_insert_without_client_ids_inserts_every_row(database):
+    rows = [make_row(glucose=110), make_row(glucose=110)]
+
+    assert len(database.add_tests_bulk(rows)) == 2
+    assert len(database.get_user_tests(1)) == 2
+
+
+def test_delete_with_user_id_only_deletes_that_users_test(database):
+    test = database.add_test(1, 120, True, "08:00", "هیچکدام")
+
+    database.delete_test(test['id'], user_id=2)
+    assert database.get_test_by_id(test['id']) is not None
+
+    database.delete_test(test['id'], user_id=1)
+    assert database.get_test_by_id(test['id']) is None
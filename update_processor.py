@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently while keeping each user's updates
+    in order.
+
+    Updates from the same user wait on that user's lock, so conversation
+    state and context.user_data are never touched by two handlers at
+    once. At most max_concurrent_updates handlers run at a time; that
+    slot is only taken once the user's lock is held, so updates queued
+    behind their own user's lock never hold a slot.
+
+    The base class's semaphore, taken by process_update around
+    do_process_update, is sized max_pending_updates instead: it bounds
+    the updates in flight (running or waiting on a user's lock), and is
+    released however processing ends, cancellation included. saturated
+    tells the webhook to refuse updates while every place is taken.
+    """
+
+    def __init__(self, max_concurrent_updates: int,
+                 max_pending_updates: Optional[int] = None):
+        if max_pending_updates is None:
+            max_pending_updates = max_concurrent_updates * 16
+        # More than one place also makes the Application process updates
+        # concurrently
+        super().__init__(max(max_pending_updates, max_concurrent_updates, 2))
+        self.max_running_updates = max_concurrent_updates
+        self._running: Optional[asyncio.Semaphore] = None
+        # user key -> [lock, number of updates holding or waiting on it]
+        self._user_locks: Dict[Hashable, List[Any]] = {}
+
+    @property
+    def saturated(self) -> bool:
+        """Whether every place for an update in flight is taken"""
+        return self._semaphore.locked()
+
+    @staticmethod
+    def _user_key(update: object) -> Optional[Hashable]:
+        if isinstance(update, Update):
+            if update.effective_user:
+                return ("user", update.effective_user.id)
+            if update.effective_chat:
+                return ("chat", update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._user_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._user_locks.get(key)
+        if entry is None:
+            entry = self._user_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_locks[key]
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self.max_running_updates)
+
+    async def shutdown(self) -> None:
+        self._user_locks.clear()
@@ -0,0 +1,164 @@
+import os
+import asyncio
+import atexit
+import hmac
+import hashlib
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhook"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def default_secret_token(bot_token: str) -> str:
+    """Derive a stable secret that survives restarts"""
+    return hashlib.sha256(f"webhook:{bot_token}".encode()).hexdigest()
+
+
+class WebhookBridge:
+    """Runs the bot Application on an event loop in a background thread
+    and feeds it updates received by the WSGI app.
+
+    Updates go through the Application's update_queue, which is bounded:
+    when it is full, or the update processor has no place left for
+    another update in flight, the webhook answers 503 so Telegram
+    retries later instead of the process buffering without limit.
+
+    Run exactly one process. Conversation state, SQLitePersistence, the
+    JobQueue (reminders, precompute) and the outgoing rate limiter all
+    live in this process, so a second gunicorn worker or replica would
+    see only some of a user's conversation steps and send every reminder
+    again. The Procfile pins --workers 1 and uses threads for the WSGI
+    side instead.
+    """
+
+    def __init__(self, application_factory: Callable[..., Application],
+                 webhook_url: str, secret_token: str, queue_size: int = 256,
+                 enqueue_timeout: float = 5):
+        self.application_factory = application_factory
+        self.webhook_url = webhook_url.rstrip("/") + WEBHOOK_PATH
+        self.secret_token = secret_token
+        self.queue_size = queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.application: Optional[Application] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="bot-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError("Could not start the bot") from self._error
+        atexit.register(self.stop)
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.application = self.application_factory(
+                update_queue_size=self.queue_size, use_updater=False)
+            self.loop.run_until_complete(self._start_application())
+        except BaseException as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()
+        self.loop.run_forever()
+
+    async def _start_application(self) -> None:
+        await self.application.initialize()
+        if self.application.post_init:
+            await self.application.post_init(self.application)
+        await self.application.start()
+        await self.application.bot.set_webhook(
+            url=self.webhook_url,
+            secret_token=self.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40")))
+        logger.info(f"Webhook registered at {self.webhook_url}")
+
+    async def _enqueue(self, data: dict) -> bool:
+        if getattr(self.application.update_processor, "saturated", False):
+            return False
+        update = Update.de_json(data, self.application.bot)
+        try:
+            self.application.update_queue.put_nowait(update)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def enqueue(self, data: dict) -> bool:
+        """Hand a raw update to the bot loop; False if it has no room or
+        the loop did not take it within enqueue_timeout seconds"""
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(data), self.loop)
+        try:
+            return future.result(timeout=self.enqueue_timeout)
+        except FutureTimeoutError:
+            # The bot loop is too busy to take it; Telegram will retry
+            future.cancel()
+            return False
+
+    async def _stop_application(self) -> None:
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+        if self.application.post_shutdown:
+            await self.application.post_shutdown(self.application)
+
+    def stop(self) -> None:
+        if self.loop is None or not self.loop.is_running():
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            self._stop_application(), self.loop)
+        try:
+            future.result(timeout=30)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def create_app(bridge: WebhookBridge):
+    """Create the WSGI app that receives Telegram webhook calls"""
+    from flask import Flask, request
+
+    app = Flask(__name__)
+
+    @app.post(WEBHOOK_PATH)
+    def telegram_webhook():
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, bridge.secret_token):
+            return "", 403
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return "", 400
+
+        if not bridge.enqueue(data):
+            logger.warning("No room for the update, asking Telegram to retry")
+            return "", 503, {"Retry-After": "1"}
+
+        return "", 200
+
+    @app.get("/health")
+    def health():
+        queue = bridge.application.update_queue
+        status = {"status": "ok", "queued_updates": queue.qsize(),
+                  "queue_size": queue.maxsize}
+        rate_limiter = bridge.application.bot.rate_limiter
+        if hasattr(rate_limiter, "metrics"):
+            status["outbound"] = rate_limiter.metrics()
+        return status
+
+    return app
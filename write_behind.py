@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import uuid
+import threading
+from typing import Callable, Dict, List, Optional
+
+from storage import jalali_columns
+
+
+class WriteBehindDatabase:
+    """Acknowledges add_test immediately and inserts rows in batches.
+
+    Each new row gets a client_id and is appended to a local journal
+    (fsynced) before add_test returns. A background thread sends pending
+    rows to Database.add_tests_bulk when batch_size rows are waiting or
+    flush_interval seconds have passed, retrying with backoff on failure.
+    The journal is rewritten to hold only unsent rows after each
+    successful batch and is replayed by start(), so acknowledged tests
+    survive a crash. Rows are upserted on client_id, so a replayed batch
+    is not inserted twice.
+
+    Every other Database method is passed through unchanged. Tests still
+    waiting in the queue are not visible to reads until they are flushed;
+    call flush() first where a read must include them.
+    """
+
+    def __init__(self, database, journal_path: str, batch_size: int = 100,
+                 flush_interval: float = 2, max_backoff: float = 60):
+        self.database = database
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.flushed_batches = 0
+        self._pending: List[Dict] = []
+        self._condition = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._flush_requested = False
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def add_flush_listener(self, listener: Callable[[List[Dict]], None]) -> None:
+        """Call listener(rows) after each batch reaches the database"""
+        self._listeners.append(listener)
+
+    def start(self) -> None:
+        """Replay the journal and start the background flusher"""
+        if self._thread is not None:
+            return
+        with self._condition:
+            self._pending = self._read_journal()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if self._pending:
+            print(f"Replaying {len(self._pending)} journaled tests")
+        self._thread = threading.Thread(
+            target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flush what is pending and stop the background thread"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+        self._journal.close()
+        self._journal = None
+
+    def flush(self, user_id: Optional[int] = None, timeout: float = 30) -> bool:
+        """Send pending tests now and wait until they are in the database
+
+        With user_id only that user's tests are waited for. Returns False
+        if some were still pending after timeout seconds.
+        """
+        def done() -> bool:
+            return not any(user_id is None or row['user_id'] == user_id
+                           for row in self._pending)
+
+        with self._condition:
+            if done():
+                return True
+            if self._thread is None:
+                return False
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(done, timeout)
+
+    def _read_journal(self) -> List[Dict]:
+        if not os.path.exists(self.journal_path):
+            return []
+        rows = []
+        with open(self.journal_path, encoding="utf-8") as journal:
+            for line in journal:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    print(f"Skipping unreadable journal line: {line[:80]}")
+                    continue
+                if "jalali_year" not in row:
+                    # Journaled before rows carried the jalali_* columns
+                    row.update(jalali_columns(row["shamsi_date"]))
+                rows.append(row)
+        return rows
+
+    def _append_journal(self, row: Dict) -> None:
+        with self._journal_lock:
+            self._journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _rewrite_journal(self, rows: List[Dict]) -> None:
+        with self._journal_lock:
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as tmp:
+                for row in rows:
+                    tmp.write(json.dumps(row, ensure_ascii=False) + "\n")
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self._journal.close()
+            os.replace(tmp_path, self.journal_path)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def add_test(self, user_id: int, glucose: int, fasting: bool,
+                 test_time: str, symptoms: str, notes: Optional[str] = None) -> Optional[Dict]:
+        """Journal a new glucose test and queue it for a batched insert"""
+        if self._thread is None:
+            self.start()
+        try:
+            row = self.database.build_test_row(
+                user_id, glucose, fasting, test_time, symptoms, notes)
+            row["client_id"] = str(uuid.uuid4())
+            with self._condition:
+                self._append_journal(row)
+                self._pending.append(row)
+                if len(self._pending) >= self.batch_size:
+                    self._condition.notify()
+            return row
+        except Exception as e:
+            print(f"Error journaling test: {e}")
+            return None
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._stopping and not self._flush_requested
+                       and len(self._pending) < self.batch_size
+                       and time.monotonic() < deadline):
+                    self._condition.wait(deadline - time.monotonic())
+                batch = self._pending[:self.batch_size]
+                stopping = self._stopping
+                if not self._pending[self.batch_size:]:
+                    self._flush_requested = False
+
+            if batch:
+                if self.database.add_tests_bulk(batch) is None:
+                    if stopping:
+                        # Keep the journal for replay on the next start
+                        return
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = 1.0
+                with self._condition:
+                    del self._pending[:len(batch)]
+                    self._rewrite_journal(self._pending)
+                    # Wakes flush() callers
+                    self._condition.notify_all()
+                self.flushed_batches += 1
+                for listener in self._listeners:
+                    listener(batch)
+            elif stopping:
+                return